@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Zipline bundle ingest 管理 - 已涵蓋的標的與日期不重複 ingest
+
+每次成功 ingest 後在快取目錄寫入 manifest (標的、日期區間、ingest 時間戳)，
+下次啟動時比對需求：缺標的 → zipline add，缺尾端日期 → zipline update，
+無法判斷或需要更早的日期 → 完整 ingest；全部涵蓋則直接略過。
+"""
+
+import os
+import sys
+import json
+import subprocess
+import pandas as pd
+
+from data_cache import DATA_CACHE_DIR, bundle_ingest_timestamp, invalidate_cache
+
+
+def _manifest_path(bundle):
+    return os.path.join(DATA_CACHE_DIR, 'ingest', f"{bundle}.json")
+
+
+def _parse_tickers(tickers):
+    if tickers is None:
+        return set()
+    if isinstance(tickers, str):
+        tickers = tickers.split()
+    return {str(ticker) for ticker in tickers}
+
+
+def _parse_date(date):
+    date = date if isinstance(date, pd.Timestamp) else pd.Timestamp(str(date))
+    return (date.tz_localize(None) if date.tz is not None else date).normalize()
+
+
+def _inspect_bundle(bundle):
+    """直接讀取 bundle 的資產資料 (沒有 manifest 時的備援)，期貨以 root_symbol 為標的"""
+    try:
+        from zipline.data.bundles import load
+        asset_finder = load(bundle).asset_finder
+        assets = asset_finder.retrieve_all(asset_finder.sids)
+    except Exception:
+        return None
+    if not assets:
+        return None
+
+    # 期貨合約的 end_date 為到期日，可能晚於實際資料，只採用不晚於今天的日期
+    return {
+        'tickers': {getattr(asset, 'root_symbol', None) or asset.symbol for asset in assets},
+        'start': min(_parse_date(asset.start_date) for asset in assets),
+        'end': min(max(_parse_date(asset.end_date) for asset in assets), pd.Timestamp.today().normalize()),
+    }
+
+
+def bundle_coverage(bundle):
+    """取得 bundle 目前涵蓋的標的與日期
+
+    Returns:
+        dict: {'tickers': set, 'start': Timestamp, 'end': Timestamp, 'stamp': str}；bundle 不存在時回傳 None
+    """
+    stamp = bundle_ingest_timestamp(bundle)
+    if stamp is None:
+        return None
+
+    coverage = None
+    try:
+        with open(_manifest_path(bundle), encoding='utf-8') as f:
+            manifest = json.load(f)
+        # manifest 只在對應同一次 ingest 時可信 (bundle 可能在外部被重新 ingest)
+        if manifest.get('stamp') == stamp:
+            coverage = manifest
+    except (OSError, ValueError):
+        pass
+
+    if coverage is None:
+        coverage = _inspect_bundle(bundle)
+        if coverage is None:
+            return None
+
+    return {
+        'tickers': _parse_tickers(coverage['tickers']),
+        'start': _parse_date(coverage['start']),
+        'end': _parse_date(coverage['end']),
+        'stamp': stamp,
+    }
+
+
+def _plan_actions(coverage, tickers, start, end):
+    if coverage is None:
+        return [('full', None)]
+    if start < coverage['start']:
+        # zipline update 只能往後延伸，更早的日期只能完整重建
+        return [('full', None)]
+
+    actions = []
+    missing = sorted(tickers - coverage['tickers'])
+    if missing:
+        actions.append(('add', missing))
+    if end > coverage['end']:
+        actions.append(('update', None))
+    return actions
+
+
+def plan_ingest(bundle, tickers, start_date, end_date):
+    """比對需求與現有 bundle，決定要執行的 ingest 動作
+
+    Returns:
+        list: [('full', None)] / [('add', 缺少的標的), ('update', None)] 的組合；空串列表示資料已齊全
+    """
+    return _plan_actions(bundle_coverage(bundle), _parse_tickers(tickers), _parse_date(start_date), _parse_date(end_date))
+
+
+def _write_manifest(bundle, tickers, start, end):
+    path = _manifest_path(bundle)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'bundle': bundle,
+            'tickers': sorted(tickers),
+            'start': start.strftime('%Y%m%d'),
+            'end': end.strftime('%Y%m%d'),
+            'stamp': bundle_ingest_timestamp(bundle),
+        }, f, ensure_ascii=False, indent=2)
+
+
+def _run_zipline(args, env, cwd):
+    command = [sys.executable, '-m', 'zipline'] + args
+    print(f"⚙️  執行: zipline {' '.join(args)}")
+    result = subprocess.run(command, capture_output=True, text=True, env=env, cwd=cwd)
+    if result.returncode != 0:
+        raise RuntimeError(f"zipline {args[0]} 失敗: {result.stderr.strip()}")
+
+
+def ensure_bundle(bundle, tickers=None, start_date=None, end_date=None, ticker_env='future',
+                  full_ingest=None, cwd=None):
+    """確保 bundle 涵蓋所需的標的與日期，只 ingest 缺少的部分
+
+    Args:
+        bundle: bundle 名稱 (如 'tquant_future'、'tquant')
+        tickers: 需要的標的 (串列或空白分隔字串)，預設讀取環境變數 ticker_env
+        start_date, end_date: 需要的日期 (YYYYMMDD 或可解析的日期)，預設讀取環境變數 mdate
+        ticker_env: TQuant ingest 讀取的標的環境變數 (期貨 'future'、股票 'ticker')
+        full_ingest: 完整 ingest 的函式 (如 simple_ingest 的 lambda)，預設執行 zipline ingest -b bundle
+        cwd: zipline 子程序的工作目錄，預設為目前目錄
+
+    Returns:
+        list: 實際執行的動作 (空串列表示 bundle 已是最新，未執行任何 ingest)
+    """
+    if tickers is None:
+        tickers = os.environ.get(ticker_env, '')
+    if start_date is None or end_date is None:
+        env_start, env_end = os.environ['mdate'].split()
+        start_date = env_start if start_date is None else start_date
+        end_date = env_end if end_date is None else end_date
+
+    tickers = _parse_tickers(tickers)
+    start, end = _parse_date(start_date), _parse_date(end_date)
+    coverage = bundle_coverage(bundle)
+    actions = _plan_actions(coverage, tickers, start, end)
+    if not actions:
+        print(f"✅ bundle '{bundle}' 已涵蓋 {len(tickers)} 檔標的與 {start.date()} ~ {end.date()}，略過 ingest")
+        return actions
+
+    if coverage is None:
+        coverage = {'tickers': set(), 'start': start, 'end': end}
+    # 完整重建時保留原有標的，避免其他程式依賴的資料被移除
+    env = dict(os.environ, mdate=f"{min(start, coverage['start']):%Y%m%d} {max(end, coverage['end']):%Y%m%d}")
+    env[ticker_env] = ' '.join(sorted(tickers | coverage['tickers']))
+
+    for action, detail in actions:
+        if action == 'full':
+            print(f"📦 完整 ingest bundle '{bundle}' ({env['mdate']})")
+            if full_ingest is not None:
+                # 自訂 ingest 只保證涵蓋本次需求
+                full_ingest()
+                coverage = {'tickers': set(), 'start': start, 'end': end}
+            else:
+                _run_zipline(['ingest', '-b', bundle], env, cwd)
+        elif action == 'add':
+            print(f"➕ 新增標的至 bundle '{bundle}': {' '.join(detail)}")
+            _run_zipline(['add', '-b', bundle, '-t', ' '.join(detail)], env, cwd)
+        elif action == 'update':
+            print(f"🔄 更新 bundle '{bundle}' 至最新交易日")
+            _run_zipline(['update', '-b', bundle], env, cwd)
+
+    _write_manifest(bundle, tickers | coverage['tickers'], min(start, coverage['start']), max(end, coverage['end']))
+    # bundle 內容已改變，清除以此 bundle 建立的資料快取 (含增量日期區間快取)
+    invalidate_cache(bundle=bundle)
+    return actions
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+連續月期貨多版本建構 - 合約資料只載入一次，同時計算多種換月方式、價格調整與 offset
+
+get_continues_futures_price 每個 (roll_style, adjustment, offset, field) 組合都要重新查詢；
+這裡由合約層級資料 (FuturesContractIndex) 一次算出所有版本：
+    換月日期    每種 roll_style 只判斷一次，各 offset 共用
+    調整係數    每個 (roll_style, offset) 只以換月前一日收盤價計算一次，add / mul 與各價格欄位共用
+規則 (近似 zipline 連續月)：
+    calendar  近月合約最後交易日 (提前 roll_days 個交易日) 後換到下一個合約
+    volume    前一交易日次月成交量大於近月時提前換月，換月後不換回；最晚同 calendar
+    mul / add 以換月前一日 新合約收盤 / 舊合約收盤 (比值 / 差值) 向後調整歷史價格，最新價格不變
+成交量、未平倉量不做價格調整。
+"""
+
+import numpy as np
+import pandas as pd
+
+from futures_index import FuturesContractIndex
+
+# ==================== 建構設定 ====================
+PRICE_FIELDS = ('open', 'high', 'low', 'close')  # 換月時需要調整的價格欄位
+COLUMN_LEVELS = ['roll_style', 'adjustment', 'offset', 'field']
+
+
+def _contract_order(close):
+    """合約依最後有資料的日期 (到期先後) 排序，同日再依合約代碼"""
+    valid = close.notna().to_numpy()
+    last = np.where(valid.any(axis=0), len(close) - 1 - np.argmax(valid[::-1], axis=0), -1)
+    order = sorted(range(close.shape[1]), key=lambda j: (last[j], str(close.columns[j])))
+    return [close.columns[j] for j in order], last[order]
+
+
+def _front_contracts(last, volume, roll_style, roll_days):
+    """每個交易日的近月合約位置 (依排序後的合約)"""
+    n_days, n_contracts = volume.shape
+    # 到區間結束仍在交易的合約不提前換月
+    limit = np.where(last >= n_days - 1, n_days - 1, last - roll_days)
+    front = np.searchsorted(np.maximum.accumulate(limit), np.arange(n_days), side='left')
+    if roll_style == 'calendar':
+        return front
+    if roll_style != 'volume':
+        raise ValueError(f"未知的換月方式: {roll_style} (可用: calendar, volume)")
+
+    # 以前一交易日成交量判斷，避免使用當日資訊
+    previous = np.vstack([np.full((1, n_contracts), np.nan), volume[:-1]])
+    rows = np.arange(n_days)
+    has_next = front + 1 < n_contracts
+    front_volume = previous[rows, np.minimum(front, n_contracts - 1)]
+    next_volume = previous[rows, np.minimum(front + 1, n_contracts - 1)]
+    candidate = np.where(has_next & (next_volume > front_volume), front + 1, front)
+    return np.maximum.accumulate(candidate)
+
+
+def _gather(values, contracts):
+    """依每日合約位置取值，超出合約數量為 NaN"""
+    n_days, n_contracts = values.shape
+    valid = contracts < n_contracts
+    picked = values[np.arange(n_days), np.minimum(contracts, n_contracts - 1)]
+    return np.where(valid, picked, np.nan)
+
+
+def _roll_adjustments(close, contracts):
+    """換月調整：回傳每日的 (乘法係數, 加法差額)，為該日之後所有換月的累積"""
+    n_days = len(contracts)
+    ratio, diff = np.ones(n_days), np.zeros(n_days)
+    rolls = np.flatnonzero(contracts[1:] != contracts[:-1]) + 1
+    if len(rolls):
+        old = _gather(close[rolls - 1], contracts[rolls - 1])
+        new = _gather(close[rolls - 1], contracts[rolls])
+        ok = np.isfinite(old) & np.isfinite(new) & (old != 0)
+        ratio[rolls[ok]] = new[ok] / old[ok]
+        diff[rolls[ok]] = new[ok] - old[ok]
+    # 某日的係數 = 之後 (不含當日) 所有換月的累積
+    multiplier = np.append(np.cumprod(ratio[::-1])[::-1][1:], 1.0)
+    addend = np.append(np.cumsum(diff[::-1])[::-1][1:], 0.0)
+    return multiplier, addend
+
+
+def build_continuous_variants(contracts, root_symbol, fields=('close',), offsets=(0,), roll_styles=('calendar',),
+                              adjustments=('mul',), roll_days=0):
+    """一次計算多種連續月版本
+
+    Args:
+        contracts: FuturesContractIndex，或 get_futures_prices 的長表
+        root_symbol: 商品代碼 (如 'TX')
+        fields: 欄位 (open / high / low / close / volume...)
+        offsets: 0 為近月、1 為次月...
+        roll_styles: 'calendar' / 'volume'
+        adjustments: 'add' / 'mul' / None
+        roll_days: calendar 換月提前的交易日數
+
+    Returns:
+        DataFrame: 日期索引，欄位為 (roll_style, adjustment, offset, field) MultiIndex
+                   (adjustment 為 None 時欄位標籤為 'none')
+    """
+    if not isinstance(contracts, FuturesContractIndex):
+        contracts = FuturesContractIndex.from_prices(contracts)
+    unknown = set(adjustments) - {'add', 'mul', None}
+    if unknown:
+        raise ValueError(f"未知的調整方式: {', '.join(map(str, unknown))} (可用: add, mul, None)")
+
+    close = contracts.get('close', root_symbol)
+    symbols, last = _contract_order(close)
+    close = close[symbols]
+    needed = dict.fromkeys(['close', *fields, *(['volume'] if 'volume' in contracts.fields else [])])
+    tables = {field: contracts.get(field, root_symbol).reindex(index=close.index, columns=symbols).to_numpy(dtype=float)
+              for field in needed}
+    close_values = tables['close']
+    volume_values = tables.get('volume', np.zeros_like(close_values))
+
+    columns = {}
+    for roll_style in roll_styles:
+        front = _front_contracts(last, volume_values, roll_style, roll_days)
+        for offset in offsets:
+            chain = front + offset
+            multiplier, addend = _roll_adjustments(close_values, chain)
+            for field in fields:
+                raw = _gather(tables[field], chain)
+                for adjustment in adjustments:
+                    if adjustment is None or field not in PRICE_FIELDS:
+                        values = raw
+                    elif adjustment == 'mul':
+                        values = raw * multiplier
+                    else:
+                        values = raw + addend
+                    columns[(roll_style, adjustment or 'none', offset, field)] = values
+
+    result = pd.DataFrame(columns, index=close.index)
+    result.columns = result.columns.set_names(COLUMN_LEVELS)
+    return result
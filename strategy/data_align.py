@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+As-of 日期對齊 - 把低頻或不規則資料 (月景氣分數、散戶多空比...) 對齊到交易日
+
+以 int64 日期陣列二分搜尋，每個目標日期取「不晚於該日的最近一筆」，
+不需要 resample('D') 展開成每日資料再 join。可設定：
+    lag            往前多取幾期 (如景氣分數 shift(1) 避免未來資料洩漏)
+    max_staleness  最近一筆資料距今超過多久即視為缺值
+    extend         最後一筆資料之後的日期是否沿用 (False 時同 resample 到最後一期為止)
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def to_int64_dates(dates):
+    """日期序列轉為 int64 奈秒陣列 (帶時區時為 UTC 奈秒)
+
+    先統一為奈秒解析度：asi8 依索引本身的解析度 (如 Parquet 讀回的微秒) 回傳，不同解析度不能直接比較。
+    """
+    return pd.DatetimeIndex(dates).as_unit('ns').asi8
+
+
+def _match_tz(left, right):
+    """只有一邊帶時區時，去掉時區以當地時間比較"""
+    if (left.tz is None) != (right.tz is None):
+        left = left.tz_localize(None) if left.tz is not None else left
+        right = right.tz_localize(None) if right.tz is not None else right
+    return left, right
+
+
+def asof_positions(left, right, lag=0, max_staleness=None, extend=True):
+    """計算每個目標日期對應的資料位置
+
+    Args:
+        left: 目標日期 (int64 奈秒陣列，見 to_int64_dates)
+        right: 資料日期 (已排序的 int64 奈秒陣列)
+        lag: 往前多取幾期資料
+        max_staleness: 最近一筆資料的最長沿用時間 (Timedelta 或奈秒數)，None 表示不限制；
+                       以最近一筆資料的日期計算 (不受 lag 影響)
+        extend: False 時晚於最後一筆資料日期的目標日期視為缺值
+
+    Returns:
+        np.ndarray: 資料位置 (int64)，-1 表示沒有對應資料
+    """
+    left, right = np.asarray(left, dtype=np.int64), np.asarray(right, dtype=np.int64)
+    positions = np.searchsorted(right, left, side='right') - 1
+    valid = positions >= 0
+    if len(right) == 0:
+        return np.full(len(left), -1, dtype=np.int64)
+
+    if max_staleness is not None:
+        staleness = pd.Timedelta(max_staleness).value
+        valid &= left - right[np.maximum(positions, 0)] <= staleness
+    if not extend:
+        valid &= left <= right[-1]
+
+    positions = positions - lag
+    valid &= positions >= 0
+    return np.where(valid, positions, -1)
+
+
+def asof_align(index, data, lag=0, max_staleness=None, extend=True):
+    """將以日期為索引的資料 as-of 對齊到目標日期
+
+    Args:
+        index: 目標日期 (如交易日索引)
+        data: 以日期為索引的 Series / DataFrame (未排序時會先排序)
+        lag, max_staleness, extend: 同 asof_positions
+
+    Returns:
+        以 index 為索引的 Series / DataFrame，沒有對應資料處為 NaN
+    """
+    index = pd.DatetimeIndex(index)
+    if len(data) == 0:
+        # 沒有資料時全部為缺值 (take 無法對空資料取值)
+        return data.iloc[:0].reindex(index)
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index(kind='stable')
+    left, right = _match_tz(index, pd.DatetimeIndex(data.index))
+
+    positions = asof_positions(to_int64_dates(left), to_int64_dates(right), lag=lag, max_staleness=max_staleness,
+                               extend=extend)
+    valid = positions >= 0
+    aligned = data.take(np.maximum(positions, 0)).set_axis(index, axis=0)
+    if valid.all():
+        return aligned
+    if isinstance(aligned, pd.DataFrame):
+        return aligned.where(np.broadcast_to(valid[:, None], aligned.shape))
+    return aligned.where(valid)
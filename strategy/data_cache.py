@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地資料快取層 - 將 TQuant / TEJ 資料函式的結果存成 Parquet
+
+快取鍵 = 函式名稱 + 呼叫參數 + bundle ingest 時間戳，
+同一組參數在 bundle 重新 ingest 後會自動失效並覆寫；讀取時以記憶體映射 (memory map) 載入。
+有日期區間參數的資料 (TEJ 資料表、連續月價格) 可改用 cached_date_range 只補抓缺少的日期，
+來自 bundle 的區間快取同樣記錄 ingest 時間戳，bundle 重新 ingest 後整段重抓。
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# ==================== 快取設定 ====================
+DATA_CACHE_DIR = os.environ.get('TQUANT_DATA_CACHE', os.path.join(os.path.expanduser('~'), '.tquant_cache'))
+SERIES_COLUMN = '__series__'  # Series 存檔時使用的欄位名稱
+
+
+def bundle_ingest_timestamp(bundle):
+    """取得 bundle 最新一次 ingest 的時間戳字串 (找不到時回傳 None)"""
+    if bundle is None:
+        return None
+
+    try:
+        from zipline.data.bundles import ingestions_for_bundle
+        ingestions = ingestions_for_bundle(bundle)
+        if ingestions:
+            return pd.Timestamp(ingestions[0]).strftime('%Y%m%dT%H%M%S')
+    except Exception:
+        pass
+
+    # 備援：直接掃描 bundle 目錄 (每次 ingest 產生一個以時間命名的子目錄)
+    zipline_root = os.environ.get('ZIPLINE_ROOT', os.path.join(os.path.expanduser('~'), '.zipline'))
+    bundle_dir = os.path.join(zipline_root, 'data', bundle)
+    if os.path.isdir(bundle_dir):
+        ingestions = sorted(name for name in os.listdir(bundle_dir) if not name.startswith('.'))
+        if ingestions:
+            return ingestions[-1]
+    return None
+
+
+def _func_name(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def _args_key(func_name, kwargs):
+    payload = json.dumps({'func': func_name, 'kwargs': kwargs}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _entry_dir(cache_dir, func_name, kwargs):
+    return os.path.join(cache_dir, func_name, _args_key(func_name, kwargs))
+
+
+def write_frame(data, path):
+    """將 Series / DataFrame 寫成 Parquet (Series 以單一欄位保存，讀回時還原)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if isinstance(data, pd.Series):
+        frame = data.to_frame(SERIES_COLUMN)
+        frame.attrs['series_name'] = data.name
+    else:
+        frame = data
+    tmp_path = path + '.tmp'
+    frame.to_parquet(tmp_path)
+    os.replace(tmp_path, path)  # 寫完才換名，避免中斷時留下損毀檔
+
+
+def read_frame(path):
+    """以記憶體映射讀取 Parquet (無 pyarrow 時退回一般讀取)"""
+    if PYARROW_AVAILABLE:
+        frame = pd.read_parquet(path, engine='pyarrow', memory_map=True)
+    else:
+        frame = pd.read_parquet(path)
+    if list(frame.columns) == [SERIES_COLUMN]:
+        return frame[SERIES_COLUMN].rename(frame.attrs.get('series_name'))
+    return frame
+
+
+def cached_call(func, cache_dir=None, max_age=None, refresh=False, **kwargs):
+    """帶快取的資料函式呼叫
+
+    Args:
+        func: 資料函式 (如 get_continues_futures_price)，只以關鍵字參數呼叫
+        cache_dir: 快取目錄，預設 DATA_CACHE_DIR
+        max_age: 快取最長有效秒數 (None 表示只依 bundle 時間戳失效，適合 TEJ API 等非 bundle 資料時設定)
+        refresh: True 時忽略既有快取並重新抓取
+        **kwargs: 傳給 func 的參數；若含 bundle，其 ingest 時間戳會納入快取鍵
+
+    Returns:
+        func 的回傳值 (Series / DataFrame)；None 或空資料不寫入快取
+    """
+    cache_dir = DATA_CACHE_DIR if cache_dir is None else cache_dir
+    func_name = _func_name(func)
+    entry_dir = _entry_dir(cache_dir, func_name, kwargs)
+    stamp = bundle_ingest_timestamp(kwargs.get('bundle')) or 'no_bundle'
+    path = os.path.join(entry_dir, f"{stamp}.parquet")
+
+    if not refresh and os.path.exists(path):
+        if max_age is None or time.time() - os.path.getmtime(path) <= max_age:
+            print(f"💾 快取命中: {func.__name__} ({stamp})")
+            return read_frame(path)
+
+    data = func(**kwargs)
+    if data is None or len(data) == 0:
+        return data
+
+    # 同參數舊 ingest 的快取一併清除，只保留最新一份
+    if os.path.isdir(entry_dir):
+        shutil.rmtree(entry_dir)
+    write_frame(data, path)
+    with open(os.path.join(entry_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'func': func_name, 'kwargs': kwargs, 'bundle_stamp': stamp,
+                   'created': pd.Timestamp.now().isoformat()}, f, ensure_ascii=False, default=str, indent=2)
+    print(f"💾 已寫入快取: {func.__name__} ({stamp})")
+    return data
+
+
+def invalidate_cache(func=None, bundle=None, key=None, cache_dir=None):
+    """手動清除快取
+
+    Args:
+        func: 只清除此函式的快取 (None 表示全部)
+        bundle: 只清除以此 bundle 建立的快取 (如重新 ingest 後清理 tquant_future 相關資料)，含增量日期區間快取
+        key: 清除指定的增量日期區間快取 (cached_date_range 的 key)；func / bundle / key 皆未指定時全部清除
+        cache_dir: 快取目錄，預設 DATA_CACHE_DIR
+
+    Returns:
+        int: 清除的快取項目數
+    """
+    cache_dir = DATA_CACHE_DIR if cache_dir is None else cache_dir
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    removed = 0
+    if key is not None or func is None:
+        ranges_dir = os.path.join(cache_dir, 'ranges')
+        if key is not None:
+            range_paths = [_range_path(cache_dir, key)]
+        elif os.path.isdir(ranges_dir):
+            range_paths = [os.path.join(ranges_dir, name) for name in os.listdir(ranges_dir) if name.endswith('.parquet')]
+            if bundle is not None:
+                range_paths = [path for path in range_paths if _range_meta(path).get('bundle') == bundle]
+        else:
+            range_paths = []
+        for path in range_paths:
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+            if os.path.exists(path + '.json'):
+                os.remove(path + '.json')
+        if key is not None:
+            print(f"🗑️  已清除 {removed} 筆快取")
+            return removed
+
+    func_dirs = [_func_name(func)] if func is not None else [
+        name for name in os.listdir(cache_dir) if name != 'ranges'
+    ]
+    for func_name in func_dirs:
+        func_dir = os.path.join(cache_dir, func_name)
+        if not os.path.isdir(func_dir):
+            continue
+        for entry in os.listdir(func_dir):
+            entry_dir = os.path.join(func_dir, entry)
+            if not os.path.isdir(entry_dir):
+                continue
+            if bundle is not None:
+                # 無法確認來源 bundle 的項目 (如 ingest manifest、期貨合約索引) 不清除
+                try:
+                    with open(os.path.join(entry_dir, 'meta.json'), encoding='utf-8') as f:
+                        if json.load(f)['kwargs'].get('bundle') != bundle:
+                            continue
+                except (OSError, ValueError, KeyError):
+                    continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            removed += 1
+    print(f"🗑️  已清除 {removed} 筆快取")
+    return removed
+
+
+# ==================== 增量日期區間快取 ====================
+
+def _range_path(cache_dir, key):
+    return os.path.join(cache_dir, 'ranges', hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.parquet')
+
+
+def _dates_of(data, date_column):
+    dates = data.index if date_column is None else data[date_column]
+    return pd.DatetimeIndex(pd.to_datetime(dates))
+
+
+def _align_tz(timestamp, dates):
+    """將查詢日期對齊到資料日期的時區"""
+    timestamp = pd.Timestamp(timestamp)
+    if dates.tz is not None:
+        return timestamp.tz_localize(dates.tz) if timestamp.tz is None else timestamp.tz_convert(dates.tz)
+    return timestamp.tz_localize(None) if timestamp.tz is not None else timestamp
+
+
+def _overlap_matches(cached, fetched, date_column, dedup_columns):
+    """比對重疊日期的資料是否一致 (調整後連續月價格換月時會整段重算)"""
+    if isinstance(cached, pd.Series):
+        cached, fetched = cached.to_frame(SERIES_COLUMN), fetched.to_frame(SERIES_COLUMN)
+    keys = list(dedup_columns) if date_column is not None else None
+    old = cached.set_index(keys) if keys else cached
+    new = fetched.set_index(keys) if keys else fetched
+    common = old.index.intersection(new.index)
+    if len(common) == 0:
+        return False
+    old, new = old.loc[common], new.loc[common]
+    for column in new.columns.intersection(old.columns):
+        a, b = old[column].to_numpy(), new[column].to_numpy()
+        if pd.api.types.is_numeric_dtype(a.dtype) and pd.api.types.is_numeric_dtype(b.dtype):
+            if not np.allclose(a.astype(np.float64), b.astype(np.float64), rtol=1e-9, equal_nan=True):
+                return False
+        elif not (pd.Series(a).astype(str).values == pd.Series(b).astype(str).values).all():
+            return False
+    return True
+
+
+def _deduplicate(data, date_column, dedup_columns):
+    if date_column is None:
+        data = data[~data.index.duplicated(keep='last')]
+        return data.sort_index()
+    data = data.drop_duplicates(subset=list(dedup_columns), keep='last')
+    return data.sort_values(list(dedup_columns)[::-1], kind='stable').reset_index(drop=True)
+
+
+def _range_meta(path):
+    """讀取區間快取的附帶資訊 (key、已涵蓋起日、bundle 與其 ingest 時間戳)"""
+    try:
+        with open(path + '.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _range_state(path, date_column, bundle=None):
+    """讀取區間快取：回傳 (資料, 日期, 已涵蓋起日, 最後日期)，快取不存在或 bundle 已重新 ingest 時回傳 None"""
+    if not os.path.exists(path):
+        return None
+    meta = _range_meta(path)
+    if bundle is not None and meta.get('bundle_stamp') != bundle_ingest_timestamp(bundle):
+        return None
+    cached = read_frame(path)
+    dates = _dates_of(cached, date_column)
+    try:
+        first = _align_tz(meta['covered_start'], dates)
+    except (KeyError, ValueError):
+        first = dates.min()
+    return cached, dates, first, dates.max()
+
+
+def _missing_ranges(path, start_date, end_date, date_column, overlap_days, bundle=None):
+    """cached_date_range 將要抓取的區間 ('YYYY-MM-DD' 字串組)，與其判斷邏輯一致"""
+    def as_str(timestamp):
+        return pd.Timestamp(timestamp).strftime('%Y-%m-%d')
+
+    state = _range_state(path, date_column, bundle)
+    if state is None:
+        return [(as_str(start_date), as_str(end_date))]
+    _, dates, first, last = state
+    start, end = _align_tz(start_date, dates), _align_tz(end_date, dates)
+    ranges = []
+    if start < first:
+        ranges.append((as_str(start), as_str(first - pd.Timedelta(days=1))))
+    if end > last:
+        ranges.append((as_str(last - pd.Timedelta(days=overlap_days)), as_str(end)))
+    return ranges
+
+
+def cached_date_range(key, fetch, start_date, end_date, date_column='mdate', dedup_columns=None,
+                      overlap_days=0, validate_overlap=False, bundle=None, cache_dir=None):
+    """增量日期區間快取：只抓取快取之外缺少的頭尾日期，並以 mdate 去重後寫回
+
+    Args:
+        key: 資料集名稱 (如 'TWN/AAPRCDA 0050')，需唯一對應一組非日期參數
+        fetch: fetch(start, end) -> Series / DataFrame，start / end 為 'YYYY-MM-DD' 字串 (含頭尾)
+        start_date, end_date: 本次需要的日期區間
+        date_column: 日期欄位名稱；None 表示日期在索引上
+        dedup_columns: 去重鍵，預設只用日期 (多檔資料一次抓取時可用 ['coid', 'mdate'])
+        overlap_days: 尾端回補天數，用於會被修正的近期資料 (重抓部分以新資料覆蓋)
+        validate_overlap: True 時檢查重疊日期是否與快取一致，不一致 (如調整後價格整段重算) 則全部重抓
+        bundle: 資料來自的 zipline bundle；其 ingest 時間戳與快取不同時忽略快取整段重抓
+        cache_dir: 快取目錄，預設 DATA_CACHE_DIR
+
+    Returns:
+        start_date ~ end_date 區間內的資料
+    """
+    cache_dir = DATA_CACHE_DIR if cache_dir is None else cache_dir
+    dedup_columns = [date_column] if dedup_columns is None else dedup_columns
+    path = _range_path(cache_dir, key)
+
+    def as_str(timestamp):
+        return pd.Timestamp(timestamp).strftime('%Y-%m-%d')
+
+    def select(data):
+        dates = _dates_of(data, date_column)
+        mask = (dates >= _align_tz(start_date, dates)) & (dates <= _align_tz(end_date, dates))
+        return data[mask] if date_column is None else data[mask].reset_index(drop=True)
+
+    def save(data, covered_start):
+        write_frame(data, path)
+        # 記錄已抓取過的起日 (起日可能是非交易日，不能只看資料的第一筆日期)
+        with open(path + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'covered_start': as_str(covered_start), 'bundle': bundle,
+                       'bundle_stamp': bundle_ingest_timestamp(bundle)}, f, ensure_ascii=False)
+
+    def full_refresh():
+        data = fetch(as_str(start_date), as_str(end_date))
+        if data is None or len(data) == 0:
+            return data
+        # 與快取命中時相同：回傳去重、篩選區間後的資料
+        data = _deduplicate(data, date_column, dedup_columns)
+        save(data, start_date)
+        return select(data)
+
+    state = _range_state(path, date_column, bundle)
+    if state is None:
+        print(f"📥 首次下載: {key} {as_str(start_date)} ~ {as_str(end_date)}")
+        return full_refresh()
+
+    cached, dates, first, last = state
+    start, end = _align_tz(start_date, dates), _align_tz(end_date, dates)
+
+    pieces = [cached]
+    if start < first:
+        print(f"📥 補抓前段: {key} {as_str(start)} ~ {as_str(first - pd.Timedelta(days=1))}")
+        head = fetch(as_str(start), as_str(first - pd.Timedelta(days=1)))
+        if head is not None and len(head) > 0:
+            pieces.insert(0, head)
+
+    if end > last:
+        tail_start = last - pd.Timedelta(days=overlap_days)
+        print(f"📥 增量更新: {key} {as_str(tail_start)} ~ {as_str(end)}")
+        tail = fetch(as_str(tail_start), as_str(end))
+        if tail is not None and len(tail) > 0:
+            if validate_overlap:
+                tail_dates = _dates_of(tail, date_column)
+                overlap = cached[np.asarray(dates >= tail_dates.min())]
+                if not _overlap_matches(overlap, tail, date_column, dedup_columns):
+                    print(f"⚠️  {key} 重疊區間資料已變動 (如價格調整重算)，改為完整重抓")
+                    return full_refresh()
+            pieces.append(tail)
+
+    if len(pieces) == 1:
+        print(f"💾 快取命中: {key}")
+        return select(cached)
+
+    combined = _deduplicate(pd.concat(pieces), date_column, dedup_columns)
+    save(combined, min(start, first))
+    return select(combined)
+
+
+def cached_date_range_batch(keys, fetch_many, start_date, end_date, id_column='coid', date_column='mdate',
+                            overlap_days=0, validate_overlap=False, bundle=None, cache_dir=None):
+    """多檔資料的增量日期區間快取：缺少相同區間的代碼合併成一次抓取，再依代碼拆開各自寫入快取
+
+    每個代碼的快取與 cached_date_range(keys[代碼], ...) 相同，兩者可互相沿用。
+
+    Args:
+        keys: {代碼: 快取名稱}，如 {'0050': 'tquant: TWN/AAPRCDA 0050'}
+        fetch_many: fetch_many(代碼串列, start, end) -> 含 id_column 欄位的 DataFrame
+        start_date, end_date: 本次需要的日期區間
+        id_column: 拆分資料用的代碼欄位
+        date_column, overlap_days, validate_overlap, bundle, cache_dir: 同 cached_date_range
+
+    Returns:
+        dict: {代碼: start_date ~ end_date 區間內的資料}，順序同 keys；沒有資料的代碼為同欄位的空 DataFrame
+
+    Raises:
+        ValueError: 所有代碼都沒有資料 (無法得知欄位)
+    """
+    cache_dir = DATA_CACHE_DIR if cache_dir is None else cache_dir
+
+    # 依缺少的區間分組，同一區間的代碼一次抓取
+    groups = {}
+    for code, key in keys.items():
+        path = _range_path(cache_dir, key)
+        for date_range in _missing_ranges(path, start_date, end_date, date_column, overlap_days, bundle):
+            groups.setdefault(date_range, []).append(code)
+
+    prefetched = {}
+    empty = None  # 批次資料的空表 (保留欄位與型別)
+    for (start, end), codes in groups.items():
+        print(f"📥 批次下載 {len(codes)} 檔: {' '.join(map(str, codes))} {start} ~ {end}")
+        data = fetch_many(codes, start, end)
+        if data is not None and len(data.columns) > 0:
+            empty = data.iloc[:0].reset_index(drop=True)
+        parts = {} if data is None or len(data) == 0 else dict(iter(data.groupby(id_column, sort=False)))
+        for code in codes:
+            part = parts.get(code)
+            prefetched[(code, start, end)] = part.reset_index(drop=True) if part is not None else None
+
+    def fetch_one(code):
+        def fetch(start, end):
+            if (code, start, end) in prefetched:
+                return prefetched.pop((code, start, end))
+            # 未預先抓取的區間 (如重疊區間不一致而完整重抓) 才單獨下載
+            data = fetch_many([code], start, end)
+            return data if data is None or len(data) == 0 else data[data[id_column] == code].reset_index(drop=True)
+        return fetch
+
+    results = {code: cached_date_range(key, fetch_one(code), start_date, end_date, date_column=date_column,
+                                       overlap_days=overlap_days, validate_overlap=validate_overlap,
+                                       bundle=bundle, cache_dir=cache_dir)
+               for code, key in keys.items()}
+
+    # 區間內沒有資料的代碼回傳同欄位的空表，呼叫端選取欄位時不會出錯
+    missing = [code for code, data in results.items() if data is None or len(data) == 0]
+    if missing:
+        if empty is None:
+            empty = next((data.iloc[:0].reset_index(drop=True) for data in results.values()
+                          if data is not None and len(data.columns) > 0), None)
+        if empty is None:
+            raise ValueError(f"{' '.join(map(str, missing))} 在 {start_date} ~ {end_date} 沒有資料")
+        for code in missing:
+            results[code] = empty.copy()
+    return results
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+並行資料載入 - 彼此獨立的資料來源 (連續月價格、散戶多空比、法人籌碼...) 同時抓取
+
+抓取以 I/O 等待為主 (TEJ API / bundle 讀取)，以有上限的執行緒池並行，
+總載入時間約等於最慢的單一來源，而不是所有來源相加。
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# ==================== 載入設定 ====================
+DATA_LOADER_MAX_WORKERS = 4  # 同時進行的抓取數上限 (避免超過 TEJ API 連線限制)
+
+
+def fetch_concurrently(tasks, max_workers=DATA_LOADER_MAX_WORKERS):
+    """以執行緒池並行執行多個獨立的資料抓取
+
+    Args:
+        tasks: {名稱: 無參數函式}，如 {'price': lambda: get_continues_futures_price(...)}
+        max_workers: 執行緒數上限
+
+    Returns:
+        dict: {名稱: 回傳值}，順序同 tasks
+
+    Raises:
+        RuntimeError: 任一抓取失敗時 (其餘抓取完成後才拋出，訊息含失敗的來源名稱)
+    """
+    if not tasks:
+        return {}
+
+    start = time.perf_counter()
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = {executor.submit(task): name for name, task in tasks.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+                print(f"  ✅ {name} 載入完成 ({time.perf_counter() - start:.2f}s)")
+            except Exception as e:
+                errors[name] = e
+                print(f"  ❌ {name} 載入失敗: {e}")
+
+    if errors:
+        name, error = next(iter(errors.items()))
+        raise RuntimeError(f"{name} 載入失敗: {error}") from error
+
+    print(f"⏱️  {len(tasks)} 個資料來源並行載入完成，耗時 {time.perf_counter() - start:.2f}s")
+    return {name: results[name] for name in tasks}
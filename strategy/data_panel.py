@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+期貨多來源面板 - 連續月價格、三大法人、大額交易人、散戶多空比對齊成 date × symbol × field 陣列
+
+各來源並行抓取 (法人與大額交易人一次查詢所有商品)，以日期精確對齊到同一組交易日，
+存成單一 float32 陣列；取單一欄位 (日期 × 商品) 或單一商品 (日期 × 欄位) 都不需重新組 DataFrame。
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_align import asof_align
+from data_loader import fetch_concurrently, DATA_LOADER_MAX_WORKERS
+
+# ==================== 面板設定 ====================
+PANEL_DTYPE = np.float32
+PANEL_SOURCES = ('price', 'institutions', 'oi_trader', 'retail')
+RETAIL_FIELD = 'retail_long_short_ratio'  # 散戶多空比在面板中的欄位名稱
+
+
+class FuturesPanel:
+    """date × symbol × field 的陣列面板
+
+    內部以 (field, date, symbol) 順序存放，field() 取得的 日期 × 商品 DataFrame 為連續記憶體、不複製。
+    """
+
+    def __init__(self, data, dates, symbols, fields):
+        self.data = data
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = list(symbols)
+        self.fields = list(fields)
+        self._symbol_pos = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._field_pos = {field: i for i, field in enumerate(self.fields)}
+
+    @property
+    def shape(self):
+        """(日期數, 商品數, 欄位數)"""
+        return len(self.dates), len(self.symbols), len(self.fields)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def to_array(self):
+        """date × symbol × field 陣列 (view，不複製)"""
+        return np.moveaxis(self.data, 0, -1)
+
+    def field(self, name):
+        """單一欄位：日期 × 商品"""
+        return pd.DataFrame(self.data[self._field_pos[name]], index=self.dates, columns=self.symbols, copy=False)
+
+    def symbol(self, name):
+        """單一商品：日期 × 欄位"""
+        return pd.DataFrame(self.data[:, :, self._symbol_pos[name]].T, index=self.dates, columns=self.fields)
+
+    def get(self, symbol, field):
+        return pd.Series(self.data[self._field_pos[field], :, self._symbol_pos[symbol]], index=self.dates,
+                         name=f"{symbol} {field}")
+
+    def dropna(self):
+        """只保留所有商品、所有欄位皆有值的日期"""
+        keep = ~np.isnan(self.data).any(axis=(0, 2))
+        return FuturesPanel(self.data[:, keep], self.dates[keep], self.symbols, self.fields)
+
+    def to_frame(self):
+        """長表：(date, symbol) MultiIndex × 欄位"""
+        index = pd.MultiIndex.from_product([self.dates, self.symbols], names=['date', 'symbol'])
+        return pd.DataFrame(self.data.reshape(len(self.fields), -1).T, index=index, columns=self.fields)
+
+    def __repr__(self):
+        return (f"FuturesPanel({len(self.dates)} dates × {len(self.symbols)} symbols × {len(self.fields)} fields, "
+                f"{self.nbytes / 1024 ** 2:.1f} MB)")
+
+
+def _naive_dates(dates):
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    return (dates.tz_localize(None) if dates.tz is not None else dates).normalize()
+
+
+def _as_series(data):
+    return data.iloc[:, 0] if isinstance(data, pd.DataFrame) else data
+
+
+def _oi_trader_root(coid):
+    """大額交易人 coid 為 Z + root_symbol + _A / _N，轉回 root_symbol"""
+    coid = str(coid)
+    if coid.startswith('Z') and '_' in coid:
+        return coid[1:].rsplit('_', 1)[0]
+    return coid
+
+
+def _split_by_root(frame, roots, root_column, fields, date_column='mdate'):
+    """把多商品長表拆成 {root: 以日期為索引的欄位 DataFrame}"""
+    if frame is None or len(frame) == 0:
+        return {}
+    keys = frame[root_column].map(_oi_trader_root) if root_column == 'coid' else frame[root_column]
+    frame = frame.assign(**{date_column: _naive_dates(frame[date_column])})
+    result = {}
+    for root, part in frame.groupby(keys.to_numpy(), sort=False):
+        if root in roots:
+            part = part.set_index(date_column)[list(fields)]
+            result[root] = part[~part.index.duplicated(keep='last')].sort_index()
+    return result
+
+
+def build_futures_panel(provider, root_symbols, fields, start_dt, end_dt=None, price_options=None,
+                        contract_code='A', dropna=False, max_workers=DATA_LOADER_MAX_WORKERS):
+    """並行抓取多個期貨商品、多個資料來源，對齊成 FuturesPanel
+
+    Args:
+        provider: 資料來源 (DataProvider)
+        root_symbols: 商品代碼串列，如 ['TX', 'MTX', 'TE']
+        fields: {來源: 欄位串列}，來源可為
+            'price'         get_continues_futures_price 的 field (如 ['close', 'volume'])
+            'institutions'  get_futures_institutions_data 的欄位 (如 ['oi_con_ls_net_finis'])
+            'oi_trader'     get_futures_oi_trader_data 的欄位 (如 ['top_10_trader_long_oi'])
+            'retail'        True 表示加入 retail_long_short_ratio (欄位名稱 RETAIL_FIELD)
+        start_dt, end_dt: 日期區間 ('YYYY-MM-DD')
+        price_options: 連續月參數 (offset、roll_style、adjustment、bundle)
+        contract_code: 大額交易人合約代碼 ('A' 所有合約 / 'N' 近月)
+        dropna: True 時只保留所有值皆齊全的日期
+        max_workers: 並行抓取的執行緒數上限
+
+    Returns:
+        FuturesPanel: 交易日以連續月價格日期為準 (未要求價格時為各來源日期聯集)，缺值為 NaN
+
+    Raises:
+        ValueError: 未知的資料來源
+        RuntimeError: 任一來源抓取失敗
+    """
+    unknown = set(fields) - set(PANEL_SOURCES)
+    if unknown:
+        raise ValueError(f"未知的資料來源: {', '.join(sorted(unknown))} (可用: {', '.join(PANEL_SOURCES)})")
+    roots = list(root_symbols)
+    price_options = dict(offset=0, roll_style='calendar', adjustment='add', bundle='tquant_future',
+                         **(price_options or {}))
+    price_fields = list(fields.get('price', ()))
+    inst_fields = list(fields.get('institutions', ()))
+    trader_fields = list(fields.get('oi_trader', ()))
+    use_retail = bool(fields.get('retail'))
+
+    tasks = {}
+    for root in roots:
+        for field in price_fields:
+            tasks[f'{root} {field}'] = (lambda root=root, field=field: provider.get_continues_futures_price(
+                root_symbol=root, field=field, start_dt=start_dt, end_dt=end_dt, **price_options))
+        if use_retail:
+            tasks[f'{root} 散戶多空比'] = lambda root=root: provider.retail_long_short_ratio(root_symbol=root)
+    if inst_fields:
+        tasks['三大法人'] = lambda: provider.get_futures_institutions_data(root_symbol=roots, st=start_dt, et=end_dt)
+    if trader_fields:
+        tasks['大額交易人'] = lambda: provider.get_futures_oi_trader_data(root_symbol=roots, contract_code=contract_code,
+                                                                     st=start_dt, et=end_dt)
+    loaded = fetch_concurrently(tasks, max_workers=max_workers)
+
+    # 各來源整理成 {(root, field): 以日期為索引的 Series}
+    columns = {}
+    for root in roots:
+        for field in price_fields:
+            series = _as_series(loaded[f'{root} {field}'])
+            columns[(root, field)] = series.set_axis(_naive_dates(series.index))
+    if inst_fields:
+        root_column = 'root_symbol' if 'root_symbol' in loaded['三大法人'].columns else 'coid'
+        for root, part in _split_by_root(loaded['三大法人'], roots, root_column, inst_fields).items():
+            columns.update({(root, field): part[field] for field in inst_fields})
+    if trader_fields:
+        for root, part in _split_by_root(loaded['大額交易人'], roots, 'coid', trader_fields).items():
+            columns.update({(root, field): part[field] for field in trader_fields})
+    if use_retail:
+        for root in roots:
+            series = _as_series(loaded[f'{root} 散戶多空比'])
+            columns[(root, RETAIL_FIELD)] = series.set_axis(_naive_dates(series.index))
+
+    # 交易日：以連續月價格為準，沒有價格時取各來源聯集；限制在查詢區間內
+    base = [series.index for (root, field), series in columns.items() if field in price_fields] or \
+        [series.index for series in columns.values()]
+    dates = base[0].append(base[1:]).unique().sort_values() if base else pd.DatetimeIndex([])
+    dates = dates[dates >= pd.Timestamp(start_dt)]
+    if end_dt is not None:
+        dates = dates[dates <= pd.Timestamp(end_dt)]
+
+    panel_fields = price_fields + inst_fields + trader_fields + ([RETAIL_FIELD] if use_retail else [])
+    data = np.full((len(panel_fields), len(dates), len(roots)), np.nan, dtype=PANEL_DTYPE)
+    for (root, field), series in columns.items():
+        series = series[~series.index.duplicated(keep='last')]
+        aligned = asof_align(dates, pd.to_numeric(series, errors='coerce'), max_staleness=pd.Timedelta(0))
+        data[panel_fields.index(field), :, roots.index(root)] = aligned.to_numpy(dtype=PANEL_DTYPE)
+
+    panel = FuturesPanel(data, dates, roots, panel_fields)
+    print(f"🧱 {panel}")
+    return panel.dropna() if dropna else panel
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資料來源介面 - 策略程式只透過 DataProvider 取得資料，可替換成離線來源
+
+    tquant     TEJ API / zipline TQresearch (預設，需要網路與 bundle)
+    local      本地 Parquet 檔 (可搭配 tquant 來源先錄製，之後離線重播)
+    synthetic  合成資料 (GBM 價格、均值回歸散戶情緒與籌碼)，可產生任意長度與商品數量
+
+以環境變數 TQUANT_DATA_PROVIDER 選擇，local 的資料目錄為 TQUANT_LOCAL_DATA。
+"""
+
+import os
+import json
+import zlib
+import hashlib
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+from data_cache import read_frame, write_frame, cached_date_range_batch
+
+# ==================== 資料來源設定 ====================
+DATA_PROVIDER_ENV = 'TQUANT_DATA_PROVIDER'
+LOCAL_DATA_ENV = 'TQUANT_LOCAL_DATA'
+DEFAULT_LOCAL_DATA_DIR = os.path.join(os.path.expanduser('~'), '.tquant_local_data')
+
+
+class DataProvider(ABC):
+    """資料來源介面 (方法與參數對應 TQuant Lab / tejapi 的同名函式)，子類別須實作所有方法才能建立"""
+
+    name = 'base'
+
+    @abstractmethod
+    def get_continues_futures_price(self, root_symbol, offset=0, roll_style='calendar', adjustment='mul',
+                                    field='close', start_dt=None, end_dt=None, bundle='tquant_future'):
+        """連續月期貨價格 (日期索引、單一欄位)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def retail_long_short_ratio(self, root_symbol='MTX'):
+        """散戶多空比 (日期索引的 Series)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_futures_prices(self, start_dt, end_dt, bundle='tquant_future'):
+        """bundle 內所有期貨合約的 OHLCV (長表)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_futures_institutions_data(self, root_symbol, st, et=None):
+        """期貨三大法人交易與未平倉資料"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_futures_oi_trader_data(self, root_symbol, contract_code='A', st=None, et=None):
+        """期貨大額交易人未沖銷部位資料"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def tejapi_get(self, table, **kwargs):
+        """TEJ 資料表查詢 (對應 tejapi.get)"""
+        raise NotImplementedError
+
+
+class TQuantDataProvider(DataProvider):
+    """TEJ API / zipline TQresearch 真實資料"""
+
+    name = 'tquant'
+
+    def __init__(self):
+        try:
+            from zipline.TQresearch import futures_price, futures_package
+            from zipline.TQresearch.futures_smart_money_positions import institution_future_data, rept_trader_future_data
+        except ImportError as e:
+            raise ImportError(f"zipline TQresearch 模組無法導入 ({e})，"
+                              f"可設定 {DATA_PROVIDER_ENV}=synthetic 或 local 改用離線資料") from e
+        self._futures_price = futures_price
+        self._futures_package = futures_package
+        self._institution = institution_future_data
+        self._rept_trader = rept_trader_future_data
+
+    def get_continues_futures_price(self, root_symbol, offset=0, roll_style='calendar', adjustment='mul',
+                                    field='close', start_dt=None, end_dt=None, bundle='tquant_future'):
+        return self._futures_price.get_continues_futures_price(
+            root_symbol=root_symbol, offset=offset, roll_style=roll_style, adjustment=adjustment,
+            field=field, start_dt=start_dt, end_dt=end_dt, bundle=bundle)
+
+    def retail_long_short_ratio(self, root_symbol='MTX'):
+        return self._futures_package.retail_long_short_ratio(root_symbol=root_symbol)
+
+    def get_futures_prices(self, start_dt, end_dt, bundle='tquant_future'):
+        return self._futures_price.get_futures_prices(start_dt=start_dt, end_dt=end_dt, bundle=bundle)
+
+    def get_futures_institutions_data(self, root_symbol, st, et=None):
+        kwargs = {} if et is None else {'et': et}
+        return self._institution.get_futures_institutions_data(root_symbol=root_symbol, st=st, **kwargs)
+
+    def get_futures_oi_trader_data(self, root_symbol, contract_code='A', st=None, et=None):
+        kwargs = {} if et is None else {'et': et}
+        return self._rept_trader.get_futures_oi_trader_data(root_symbol=root_symbol, contract_code=contract_code,
+                                                            st=st, **kwargs)
+
+    def tejapi_get(self, table, **kwargs):
+        """tejapi.get 查詢
+
+        tejapi 沒有提供設定 HTTP Session 的介面，每次請求各自建立連線 (無連線池)；
+        多檔代碼請用 tejapi_get_batch 合併成一次分頁查詢以減少請求數。
+        """
+        import tejapi
+        return tejapi.get(table, **kwargs)
+
+
+class LocalFileDataProvider(DataProvider):
+    """本地 Parquet 檔資料來源
+
+    每次呼叫以 (方法, 參數) 對應一個檔案 <root_dir>/<方法>/<參數雜湊>.parquet。
+    指定 source 時為錄製模式：檔案不存在就向 source 取得並存檔，之後即可離線重播。
+    """
+
+    name = 'local'
+
+    def __init__(self, root_dir=None, source=None):
+        self.root_dir = root_dir or os.environ.get(LOCAL_DATA_ENV, DEFAULT_LOCAL_DATA_DIR)
+        self.source = source
+
+    def _load(self, method, **kwargs):
+        payload = json.dumps(kwargs, sort_keys=True, default=str)
+        path = os.path.join(self.root_dir, method, hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16] + '.parquet')
+        if os.path.exists(path):
+            return read_frame(path)
+        if self.source is None:
+            raise FileNotFoundError(f"本地資料不存在: {method}({payload}) → {path}")
+
+        data = getattr(self.source, method)(**kwargs)
+        if data is not None and len(data) > 0:
+            write_frame(data, path)
+            with open(path[:-len('.parquet')] + '.json', 'w', encoding='utf-8') as f:
+                json.dump({'method': method, 'kwargs': kwargs}, f, ensure_ascii=False, default=str)
+        return data
+
+    def get_continues_futures_price(self, root_symbol, offset=0, roll_style='calendar', adjustment='mul',
+                                    field='close', start_dt=None, end_dt=None, bundle='tquant_future'):
+        return self._load('get_continues_futures_price', root_symbol=root_symbol, offset=offset,
+                          roll_style=roll_style, adjustment=adjustment, field=field,
+                          start_dt=start_dt, end_dt=end_dt, bundle=bundle)
+
+    def retail_long_short_ratio(self, root_symbol='MTX'):
+        return self._load('retail_long_short_ratio', root_symbol=root_symbol)
+
+    def get_futures_prices(self, start_dt, end_dt, bundle='tquant_future'):
+        return self._load('get_futures_prices', start_dt=start_dt, end_dt=end_dt, bundle=bundle)
+
+    def get_futures_institutions_data(self, root_symbol, st, et=None):
+        return self._load('get_futures_institutions_data', root_symbol=root_symbol, st=st, et=et)
+
+    def get_futures_oi_trader_data(self, root_symbol, contract_code='A', st=None, et=None):
+        return self._load('get_futures_oi_trader_data', root_symbol=root_symbol, contract_code=contract_code,
+                          st=st, et=et)
+
+    def tejapi_get(self, table, **kwargs):
+        return self._load('tejapi_get', table=table, **kwargs)
+
+
+def _ar1(shocks, phi, x0=0.0):
+    """AR(1) 遞迴 x[t] = phi * x[t-1] + shocks[t]，分塊以累積和向量化 (避免逐筆 Python 迴圈)
+
+    區塊內以 phi^-k 縮放後累加，區塊長度限制在 phi^-block <= 1e100 以免溢位。
+    """
+    block = int(min(256, max(1, 100 / -np.log10(phi)))) if 0 < phi < 1 else 1
+    x = np.empty(len(shocks))
+    powers = phi ** np.arange(1, block + 1)
+    last = x0
+    for start in range(0, len(shocks), block):
+        chunk = shocks[start:start + block]
+        p = powers[:len(chunk)]
+        # x[k] = phi^(k+1) * last + sum_{j<=k} phi^(k-j) * chunk[j]
+        x[start:start + len(chunk)] = p * (last + np.cumsum(chunk / p))
+        last = x[start + len(chunk) - 1]
+    return x
+
+
+class SyntheticDataProvider(DataProvider):
+    """合成資料來源 - 固定亂數種子，同一商品每次產生相同序列
+
+    價格為幾何布朗運動 (GBM)，散戶多空比、法人淨部位與景氣分數為均值回歸 (離散 OU / AR(1)) 過程。
+    日期範圍、頻率與商品數量皆可調整，用於離線效能測試。
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, start='2010-01-01', end='2025-06-30', freq='B', roots=('TX', 'MTX', 'TE', 'TF'),
+                 n_extra_roots=0, seed=0, annual_drift=0.06, annual_volatility=0.2):
+        self.calendar = pd.date_range(start, end, freq=freq, tz='UTC')
+        self.roots = list(roots) + [f"S{i:04d}" for i in range(n_extra_roots)]
+        self.seed = seed
+        self.annual_drift = annual_drift
+        self.annual_volatility = annual_volatility
+        years = max((pd.Timestamp(end) - pd.Timestamp(start)).days / 365.25, 1 / 252)
+        self._periods_per_year = len(self.calendar) / years  # 依頻率換算年化 (日線約 261，分鐘線更多)
+
+    def _rng(self, *key):
+        return np.random.default_rng([self.seed, zlib.crc32('|'.join(map(str, key)).encode('utf-8'))])
+
+    def _mask(self, start_dt, end_dt):
+        mask = np.ones(len(self.calendar), dtype=bool)
+        if start_dt is not None:
+            mask &= self.calendar >= pd.Timestamp(start_dt, tz='UTC')
+        if end_dt is not None:
+            mask &= self.calendar < pd.Timestamp(end_dt, tz='UTC') + pd.Timedelta(days=1)
+        return mask
+
+    def _spot(self, root_symbol):
+        """標的 GBM 收盤價"""
+        dt = 1 / self._periods_per_year
+        shocks = self._rng('spot', root_symbol).standard_normal(len(self.calendar))
+        log_returns = (self.annual_drift - 0.5 * self.annual_volatility ** 2) * dt \
+            + self.annual_volatility * np.sqrt(dt) * shocks
+        base = 8000.0 if root_symbol in ('TX', 'MTX') else 500.0
+        return base * np.exp(np.cumsum(log_returns))
+
+    def _ohlcv(self, root_symbol, offset=0):
+        close = self._spot(root_symbol) * (1 + 0.002 * offset)
+        rng = self._rng('ohlcv', root_symbol, offset)
+        gap = rng.normal(0, 0.002, len(close))
+        open_ = np.concatenate(([close[0]], close[:-1])) * (1 + gap)
+        spread = np.abs(rng.normal(0, 0.006, len(close)))
+        high = np.maximum(open_, close) * (1 + spread)
+        low = np.minimum(open_, close) * (1 - spread)
+        volume = rng.lognormal(11, 0.4, len(close)).astype(np.int64) // (offset + 1)
+        return {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+
+    def _mean_reverting(self, *key, mean=0.0, phi=0.95, sigma=0.05):
+        shocks = self._rng('ou', *key).normal(0, sigma, len(self.calendar))
+        return mean + _ar1(shocks, phi)
+
+    def get_continues_futures_price(self, root_symbol, offset=0, roll_style='calendar', adjustment='mul',
+                                    field='close', start_dt=None, end_dt=None, bundle='tquant_future'):
+        mask = self._mask(start_dt, end_dt)
+        values = self._ohlcv(root_symbol, offset)[field][mask]
+        return pd.DataFrame({f"{root_symbol}{offset}": values}, index=self.calendar[mask])
+
+    def retail_long_short_ratio(self, root_symbol='MTX'):
+        ratio = self._mean_reverting('retail', root_symbol, phi=0.9)
+        return pd.Series(ratio, index=self.calendar, name='ratio')
+
+    def get_futures_prices(self, start_dt, end_dt, bundle='tquant_future'):
+        mask = self._mask(start_dt, end_dt)
+        dates = self.calendar[mask]
+        # 每個交易日列出近月與次月合約 (以日曆月份為合約月，第三週後換月)
+        month = (dates.tz_localize(None).to_period('M') + (dates.day > 21).astype(int))
+        frames = []
+        for root_symbol in self.roots:
+            for offset in (0, 1):
+                contract = (month + offset).strftime('%Y%m')
+                fields = {name: values[mask] for name, values in self._ohlcv(root_symbol, offset).items()}
+                frames.append(pd.DataFrame({
+                    'date': dates,
+                    'symbol': root_symbol + contract,
+                    'root_symbol': root_symbol,
+                    **fields,
+                    'open_interest': fields['volume'] * 2,
+                }))
+        return pd.concat(frames, ignore_index=True).sort_values(['date', 'symbol'], kind='stable').reset_index(drop=True)
+
+    def get_futures_institutions_data(self, root_symbol, st, et=None):
+        mask = self._mask(st, et)
+        frames = []
+        for root in ([root_symbol] if isinstance(root_symbol, str) else root_symbol):
+            data = {'mdate': self.calendar[mask].tz_localize(None), 'root_symbol': root}
+            for investor, scale in (('finis', 20000), ('dealers', 5000), ('funds', 3000)):
+                net = np.round(self._mean_reverting('inst', root, investor, phi=0.98, sigma=0.2) * scale)[mask]
+                long = np.abs(net) + scale
+                data[f'oi_con_long_{investor}'] = long
+                data[f'oi_con_short_{investor}'] = long - net
+                data[f'oi_con_ls_net_{investor}'] = net
+            data['oi_con_ls_net_major_inst'] = sum(data[f'oi_con_ls_net_{i}'] for i in ('finis', 'dealers', 'funds'))
+            frames.append(pd.DataFrame(data))
+        return pd.concat(frames, ignore_index=True)
+
+    def get_futures_oi_trader_data(self, root_symbol, contract_code='A', st=None, et=None):
+        mask = self._mask(st, et)
+        frames = []
+        for root in ([root_symbol] if isinstance(root_symbol, str) else root_symbol):
+            total = np.round(100000 * (1 + 0.2 * self._mean_reverting('oi', root, phi=0.99, sigma=0.05)))[mask]
+            data = {'coid': root, 'mdate': self.calendar[mask].tz_localize(None), 'expired_month': contract_code,
+                    'total_mkt_oi': total}
+            for group in ('trader', 'institution'):
+                for top, share in ((5, 0.25), (10, 0.4)):
+                    for side in ('long', 'short'):
+                        pct = share + 0.05 * self._mean_reverting('oi', root, group, top, side, phi=0.97, sigma=0.1)[mask]
+                        data[f'top_{top}_{group}_{side}_oi'] = np.round(total * pct)
+                        data[f'top_{top}_{group}_{side}_oi_pct'] = pct * 100
+            frames.append(pd.DataFrame(data))
+        return pd.concat(frames, ignore_index=True)
+
+    def tejapi_get(self, table, coid=None, mdate=None, **kwargs):
+        mdate = mdate or {}
+        mask = self._mask(mdate.get('gte'), mdate.get('lte'))
+        dates = self.calendar[mask].tz_localize(None)
+        frames = []
+        for company in ([coid] if isinstance(coid, str) or coid is None else coid):
+            if table == 'GLOBAL/ANMAR':
+                # 景氣對策信號分數 (9~45)，月資料
+                score = np.clip(np.round(27 + self._mean_reverting(table, company, phi=0.995, sigma=1.0)), 9, 45)[mask]
+                frame = pd.DataFrame({'coid': company, 'mdate': dates, 'val': score})
+                frame = frame.groupby(frame['mdate'].dt.to_period('M')).head(1).reset_index(drop=True)
+            elif table == 'TWN/AAPRCDA':
+                fields = {name: values[mask] for name, values in self._ohlcv(company).items()}
+                frame = pd.DataFrame({'coid': company, 'mdate': dates,
+                                      'open_d': fields['open'], 'high_d': fields['high'], 'low_d': fields['low'],
+                                      'close_d': fields['close'], 'avgclsd': fields['close'],
+                                      'volume': fields['volume']})
+            else:
+                frame = pd.DataFrame({'coid': company, 'mdate': dates,
+                                      'val': self._mean_reverting(table, company)[mask]})
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+
+def tejapi_get_batch(provider, table, coids, start_date, end_date, overlap_days=0, cache_dir=None, **kwargs):
+    """多檔代碼合併成一次分頁查詢的 tejapi 下載，依 coid 拆開存入增量快取
+
+    快取名稱與單檔查詢 '{provider.name}: {table} {coid}' 相同；擴充代碼時只下載新代碼，
+    既有代碼只補抓缺少的日期。
+
+    Args:
+        provider: 資料來源
+        table: TEJ 資料表 (如 'TWN/AAPRCDA')
+        coids: 代碼串列
+        start_date, end_date: 日期區間 (mdate)
+        overlap_days: 尾端回補天數 (同 cached_date_range)
+        cache_dir: 快取目錄，預設 DATA_CACHE_DIR
+        **kwargs: 其餘 tejapi.get 參數 (如 opts)
+
+    Returns:
+        dict: {coid: DataFrame}，順序同 coids
+    """
+    suffix = f" {json.dumps(kwargs, sort_keys=True, default=str)}" if kwargs else ''
+    keys = {coid: f"{provider.name}: {table} {coid}{suffix}" for coid in coids}
+
+    def fetch_many(codes, start, end):
+        return provider.tejapi_get(table, coid=list(codes), mdate={'gte': start, 'lte': end}, paginate=True, **kwargs)
+
+    return cached_date_range_batch(keys, fetch_many, start_date, end_date, id_column='coid',
+                                   overlap_days=overlap_days, cache_dir=cache_dir)
+
+
+def get_data_provider(name=None, **kwargs):
+    """依名稱 (預設讀取環境變數 TQUANT_DATA_PROVIDER) 建立資料來源
+
+    Args:
+        name: 'tquant' / 'local' / 'synthetic'
+        **kwargs: 傳給資料來源建構子的參數
+
+    Raises:
+        ImportError: tquant 來源但 zipline 未安裝
+        ValueError: 未知的資料來源名稱
+    """
+    name = (name or os.environ.get(DATA_PROVIDER_ENV, 'tquant')).lower()
+    providers = {
+        'tquant': TQuantDataProvider,
+        'local': LocalFileDataProvider,
+        'synthetic': SyntheticDataProvider,
+    }
+    if name not in providers:
+        raise ValueError(f"未知的資料來源: {name} (可用: {', '.join(providers)})")
+    return providers[name](**kwargs)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+期貨合約 root_symbol 索引 - get_futures_prices 長表只分割一次，之後依商品 / 欄位直接取用
+
+get_root_symbol_ohlcv 每次呼叫都重新篩選整張多年、多商品的合約表；本索引在建立時
+依 root_symbol × 欄位 轉成 日期 × 合約 的寬表，查詢為 dict 取值 (不複製)。
+分割結果可存成 <目錄>/<root_symbol>/<欄位>.parquet，下次只讀取需要的商品與欄位。
+"""
+
+import os
+import re
+import json
+import pandas as pd
+
+from data_cache import DATA_CACHE_DIR, bundle_ingest_timestamp, read_frame, write_frame
+
+# ==================== 索引設定 ====================
+CONTRACT_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+MANIFEST_NAME = 'manifest.json'
+
+
+def _root_of(symbols):
+    """由合約代碼推得 root_symbol (去掉尾端的到期年月，如 TX202503 → TX)"""
+    return symbols.astype(str).str.replace(r'\d+$', '', regex=True)
+
+
+def _safe_name(name):
+    return re.sub(r'[^0-9A-Za-z_.-]', '_', str(name))
+
+
+class FuturesContractIndex:
+    """依 root_symbol × 欄位 分割的期貨合約價量索引
+
+    get(field, root_symbol) 的結果與 get_root_symbol_ohlcv(df_ohlcv, get_field, get_root_symbol) 相同
+    (日期 × 合約 的寬表)，回傳的是索引內部的 DataFrame，修改前請先 copy()。
+    """
+
+    def __init__(self, tables, fields, path=None):
+        self._tables = tables  # {(root_symbol, field): DataFrame 或 尚未載入時為 None}
+        self.fields = list(fields)
+        self.path = path
+
+    @classmethod
+    def from_prices(cls, df_ohlcv, fields=None, date_column='date', symbol_column='symbol'):
+        """由 get_futures_prices 的長表建立索引
+
+        Args:
+            df_ohlcv: get_futures_prices 的結果 (日期可在欄位或索引上)
+            fields: 要建立的欄位，預設為表中有的 open / high / low / close / volume
+            date_column, symbol_column: 日期與合約代碼欄位
+        """
+        data = df_ohlcv if date_column in df_ohlcv.columns else df_ohlcv.reset_index()
+        if fields is None:
+            fields = [field for field in CONTRACT_FIELDS if field in data.columns]
+        roots = data['root_symbol'] if 'root_symbol' in data.columns else _root_of(data[symbol_column])
+
+        tables = {}
+        for root, part in data.groupby(roots.to_numpy(), sort=True):
+            part = part.drop_duplicates([date_column, symbol_column], keep='last')
+            wide = part.pivot(index=date_column, columns=symbol_column, values=list(fields))
+            for field in fields:
+                table = wide[field]
+                table.columns.name = symbol_column
+                tables[(root, field)] = table
+        return cls(tables, fields)
+
+    @property
+    def roots(self):
+        return sorted({root for root, _ in self._tables})
+
+    def get(self, field, root_symbol):
+        """單一商品、單一欄位：日期 × 合約"""
+        key = (root_symbol, field)
+        if key not in self._tables:
+            raise KeyError(f"索引中沒有 {root_symbol} {field}")
+        table = self._tables[key]
+        if table is None:
+            table = self._tables[key] = read_frame(self._file(root_symbol, field))
+        return table
+
+    def _file(self, root_symbol, field):
+        return os.path.join(self.path, _safe_name(root_symbol), f"{_safe_name(field)}.parquet")
+
+    def save(self, path):
+        """以 <path>/<root_symbol>/<欄位>.parquet 存檔"""
+        self.path = path
+        for root, field in self._tables:
+            table = self.get(field, root)
+            os.makedirs(os.path.dirname(self._file(root, field)), exist_ok=True)
+            write_frame(table, self._file(root, field))
+        with open(os.path.join(path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump({'roots': self.roots, 'fields': self.fields}, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """載入存檔的索引 (各商品 / 欄位在第一次 get 時才讀取)"""
+        with open(os.path.join(path, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+        tables = {(root, field): None for root in manifest['roots'] for field in manifest['fields']}
+        return cls(tables, manifest['fields'], path=path)
+
+    def __repr__(self):
+        return f"FuturesContractIndex({len(self.roots)} roots × {len(self.fields)} fields)"
+
+
+def cached_futures_index(provider, start_dt, end_dt, bundle='tquant_future', cache_dir=None):
+    """取得期貨合約索引：同一 bundle ingest 與日期區間只抓取、分割一次
+
+    Args:
+        provider: 資料來源 (DataProvider)
+        start_dt, end_dt: 日期區間 ('YYYY-MM-DD')
+        bundle: zipline bundle 名稱
+        cache_dir: 快取目錄，預設 DATA_CACHE_DIR
+
+    Returns:
+        FuturesContractIndex
+    """
+    cache_dir = DATA_CACHE_DIR if cache_dir is None else cache_dir
+    # bundle 重新 ingest 後合約資料可能改變，以 ingest 時間戳區分
+    stamp = bundle_ingest_timestamp(bundle) if provider.name == 'tquant' else provider.name
+    if stamp is None:
+        # 無法判斷 bundle 版本時不快取
+        return FuturesContractIndex.from_prices(provider.get_futures_prices(start_dt=start_dt, end_dt=end_dt, bundle=bundle))
+    path = os.path.join(cache_dir, 'futures_index', _safe_name(f"{bundle}_{start_dt}_{end_dt}_{stamp}"))
+    if os.path.exists(os.path.join(path, MANIFEST_NAME)):
+        print(f"💾 快取命中: 期貨合約索引 {bundle} {start_dt} ~ {end_dt}")
+        return FuturesContractIndex.load(path)
+
+    print(f"📥 建立期貨合約索引: {bundle} {start_dt} ~ {end_dt}")
+    index = FuturesContractIndex.from_prices(provider.get_futures_prices(start_dt=start_dt, end_dt=end_dt, bundle=bundle))
+    index.save(path)
+    return index
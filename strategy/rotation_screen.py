@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+景氣分數輪動快速篩選 - 以每日陣列近似 zipline 回測，先大量篩選門檻組合再送 zipline 驗證
+
+近似內容 (對應 TW_Slippage + Custom_TW_Commission 的 order_target_percent 回測)：
+    - 當日收盤下單，以當日收盤價計算股數 (取整數股)，次一交易日收盤成交
+    - 滑價：買進成交價 = 收盤價 + spread * tick，賣出 = 收盤價 - spread * tick
+    - 手續費：成交金額 * 0.1425% * discount (四捨五入，最低 min_trade_cost)，賣出另加證交稅
+未模擬：volume_limit 成交量限制、漲跌停價、股利，與 zipline 的差距以 deviation_report 衡量。
+"""
+
+import numpy as np
+import pandas as pd
+
+# ==================== 成本設定 (同 strategy_industry_rotation.py 的 initialize) ====================
+COMMISSION_RATE = 0.001425
+MIN_TRADE_COST = 20
+TAX = 0.003
+SPREAD = 0.3
+TRADING_DAYS = 252
+
+
+def tw_tick_size(prices, etf=True):
+    """台股升降單位 (ETF：未滿 50 元 0.01、50 元以上 0.05)"""
+    prices = np.asarray(prices, dtype=float)
+    if etf:
+        return np.where(prices < 50, 0.01, 0.05)
+    return np.select([prices < 10, prices < 50, prices < 100, prices < 500, prices < 1000],
+                     [0.01, 0.05, 0.1, 0.5, 1.0], 5.0)
+
+
+def _session_dates(index):
+    dates = pd.DatetimeIndex(index)
+    return dates.tz_localize(None) if dates.tz is not None else dates
+
+
+def _rotation_targets(score, dates, low, high, stock_weight, exit_stock_weight, hedge_weight, hedge_start):
+    """以 numpy 計算持股狀態與每日下單目標 (NaN 表示當日不下單)"""
+    n = len(score)
+    regime = np.where(score <= low, 1.0, np.where(score >= high, 0.0, np.nan))
+    in_band = (score > low) & (score < high)
+    if in_band.any():
+        # 第一次進入景氣循環時若未持股即進場
+        regime[in_band.argmax()] = 1.0
+
+    # 門檻之間維持前一狀態 (前向填補，起始未持股)
+    filled = np.where(np.isnan(regime), -1, np.arange(n))
+    filled = np.maximum.accumulate(filled)
+    holding = np.where(filled >= 0, regime[np.maximum(filled, 0)], 0.0) == 1.0
+    previous = np.concatenate([[False], holding[:-1]])
+    enter = holding & ~previous
+    leave = ~holding & previous
+
+    stock_target = np.full(n, np.nan)
+    stock_target[enter] = stock_weight
+    stock_target[leave] = exit_stock_weight
+
+    hedge_target = np.full(n, np.nan)
+    if hedge_weight is not None:
+        # 避險資產在 hedge_start 當日收盤後才啟用；避險狀態只在進出場當日改變
+        if hedge_start is None:
+            active_from = 0
+        else:
+            started = np.flatnonzero(dates >= hedge_start)
+            active_from = started[0] + 1 if len(started) else n
+        hedged = False
+        from_low = enter & (score <= low)
+        for i in np.flatnonzero(enter | leave):
+            if i < active_from:
+                continue
+            if from_low[i] and hedged:
+                hedge_target[i] = 0.0
+                hedged = False
+            elif leave[i] and not hedged:
+                hedge_target[i] = hedge_weight
+                hedged = True
+
+    return holding, stock_target, hedge_target
+
+
+def rotation_signals(score, low=16, high=38, stock_weight=1.0, exit_stock_weight=0.0,
+                     hedge_weight=None, hedge_start=None):
+    """景氣分數輪動的進出場訊號
+
+    規則：分數 <= low 且未持股 → 買進股票 (並賣出避險)；分數 >= high 且持股 → 股票降至
+    exit_stock_weight (並買入避險)；第一次出現 low < 分數 < high 且未持股 → 買進股票 (不處理避險)。
+
+    Args:
+        score: 以交易日為 index 的景氣分數 Series
+        low, high: 進出場門檻
+        stock_weight: 進場時股票目標權重
+        exit_stock_weight: 出場時股票目標權重
+        hedge_weight: 出場時避險資產目標權重，None 表示持有現金
+        hedge_start: 避險資產開始交易日 (當日收盤後啟用)
+
+    Returns:
+        DataFrame: 欄位 score、holding、stock_target、hedge_target (NaN 表示當日不下單)
+    """
+    dates = _session_dates(score.index)
+    values = score.to_numpy(dtype=float)
+    holding, stock_target, hedge_target = _rotation_targets(
+        values, dates, low, high, stock_weight, exit_stock_weight, hedge_weight,
+        pd.Timestamp(hedge_start) if hedge_start is not None else None)
+    return pd.DataFrame({'score': values, 'holding': holding,
+                         'stock_target': stock_target, 'hedge_target': hedge_target}, index=dates)
+
+
+def _simulate(close, targets, capital_base, min_trade_cost, discount, tax, spread, etf):
+    """依下單目標逐事件計算成交，回傳 (每日股數, 每日現金, 成交筆數, 交易成本)"""
+    n_days, n_assets = close.shape
+    valuation = np.nan_to_num(pd.DataFrame(close).ffill().to_numpy())
+    delta_shares = np.zeros((n_days, n_assets))
+    delta_cash = np.zeros(n_days)
+    shares = np.zeros(n_assets)
+    cash = capital_base
+    n_trades, total_cost = 0, 0.0
+
+    order_days = np.flatnonzero(~np.isnan(targets).all(axis=1))
+    for t in order_days:
+        fill_day = t + 1
+        if fill_day >= n_days:
+            break
+        portfolio_value = cash + shares @ valuation[t]
+        for j in np.flatnonzero(~np.isnan(targets[t])):
+            price, fill_price = close[t, j], close[fill_day, j]
+            if np.isnan(price) or np.isnan(fill_price):
+                continue
+            amount = int(targets[t, j] * portfolio_value / price) - shares[j]
+            if amount == 0:
+                continue
+            tick = tw_tick_size(fill_price, etf)
+            fill_price = fill_price + spread * tick if amount > 0 else fill_price - spread * tick
+            value = fill_price * abs(amount)
+            cost = max(min_trade_cost, np.round(value * COMMISSION_RATE * discount))
+            if amount < 0:
+                cost += np.round(value * tax)
+
+            shares[j] += amount
+            cash -= amount * fill_price + cost
+            delta_shares[fill_day, j] += amount
+            delta_cash[fill_day] -= amount * fill_price + cost
+            n_trades += 1
+            total_cost += cost
+
+    positions = np.cumsum(delta_shares, axis=0)
+    cash_path = capital_base + np.cumsum(delta_cash)
+    return positions, cash_path, valuation, n_trades, total_cost
+
+
+def simulate_rotation(prices, targets, capital_base=1e5, min_trade_cost=MIN_TRADE_COST, discount=1.0,
+                      tax=TAX, spread=SPREAD, etf=True):
+    """以每日陣列近似 order_target_percent 回測
+
+    Args:
+        prices: 交易日 × 標的 的收盤價 DataFrame
+        targets: 同形狀的下單目標權重 (NaN 表示當日不下單)
+        capital_base: 初始資金
+        min_trade_cost, discount, tax: Custom_TW_Commission 參數
+        spread: TW_Slippage 的 spread (以 tick 為單位)
+        etf: 是否以 ETF 升降單位計算 tick
+
+    Returns:
+        DataFrame: portfolio_value、cash、returns、algorithm_period_return 與各標的持股數，
+                   attrs 內含 n_trades、total_cost
+    """
+    targets = targets.reindex(index=prices.index, columns=prices.columns)
+    positions, cash, valuation, n_trades, total_cost = _simulate(
+        prices.to_numpy(dtype=float), targets.to_numpy(dtype=float),
+        capital_base, min_trade_cost, discount, tax, spread, etf)
+
+    portfolio_value = cash + (positions * valuation).sum(axis=1)
+    result = pd.DataFrame(positions, index=prices.index, columns=prices.columns)
+    result.insert(0, 'portfolio_value', portfolio_value)
+    result.insert(1, 'cash', cash)
+    result.insert(2, 'returns', np.concatenate([[portfolio_value[0] / capital_base - 1],
+                                                portfolio_value[1:] / portfolio_value[:-1] - 1]))
+    result.insert(3, 'algorithm_period_return', portfolio_value / capital_base - 1)
+    result.attrs.update(n_trades=n_trades, total_cost=total_cost)
+    return result
+
+
+def _summary(portfolio_value, capital_base):
+    returns = np.diff(portfolio_value, prepend=capital_base) / np.concatenate([[capital_base], portfolio_value[:-1]])
+    years = len(portfolio_value) / TRADING_DAYS
+    total_return = portfolio_value[-1] / capital_base - 1
+    volatility = returns.std() * np.sqrt(TRADING_DAYS)
+    peak = np.maximum.accumulate(np.concatenate([[capital_base], portfolio_value]))[1:]
+    return {
+        'total_return': total_return,
+        'annualized_return': (1 + total_return) ** (1 / years) - 1 if years > 0 else 0.0,
+        'volatility': volatility,
+        'sharpe_ratio': returns.mean() / returns.std() * np.sqrt(TRADING_DAYS) if returns.std() > 0 else 0.0,
+        'max_drawdown': (portfolio_value / peak - 1).min(),
+    }
+
+
+def screen_rotations(score, prices, stock, hedge=None, configs=(), capital_base=1e5, sort_by='sharpe_ratio',
+                     **cost_kwargs):
+    """以近似回測篩選大量輪動設定
+
+    Args:
+        score: 以交易日為 index 的景氣分數 Series (同 zipline 回測期間)
+        prices: 交易日 × 標的 的收盤價 DataFrame (需含 stock 與 hedge 欄位)
+        stock, hedge: 股票與避險標的代碼 (hedge 為 None 表示出場持有現金)
+        configs: rotation_signals 參數字典的序列，如 [{'low': 16, 'high': 38}, ...]
+        capital_base: 初始資金
+        sort_by: 排序依據的績效欄位 (由大到小)
+        **cost_kwargs: 傳給 simulate_rotation 的成本參數
+
+    Returns:
+        DataFrame: 每個設定一列，含設定參數、績效、成交筆數與交易成本
+    """
+    assets = [stock] if hedge is None else [stock, hedge]
+    prices = prices.reindex(score.index)[assets]
+    close = prices.to_numpy(dtype=float)
+    dates = _session_dates(score.index)
+    values = score.to_numpy(dtype=float)
+    min_trade_cost = cost_kwargs.get('min_trade_cost', MIN_TRADE_COST)
+    discount = cost_kwargs.get('discount', 1.0)
+    tax = cost_kwargs.get('tax', TAX)
+    spread = cost_kwargs.get('spread', SPREAD)
+    etf = cost_kwargs.get('etf', True)
+
+    rows = []
+    for config in configs:
+        config = dict(config)
+        if hedge is None:
+            config['hedge_weight'] = None
+        else:
+            config.setdefault('hedge_weight', 1.0)
+        hedge_start = config.get('hedge_start')
+        _, stock_target, hedge_target = _rotation_targets(
+            values, dates, config.get('low', 16), config.get('high', 38), config.get('stock_weight', 1.0),
+            config.get('exit_stock_weight', 0.0), config['hedge_weight'],
+            pd.Timestamp(hedge_start) if hedge_start is not None else None)
+        targets = stock_target[:, None] if hedge is None else np.column_stack([stock_target, hedge_target])
+
+        positions, cash, valuation, n_trades, total_cost = _simulate(
+            close, targets, capital_base, min_trade_cost, discount, tax, spread, etf)
+        portfolio_value = cash + (positions * valuation).sum(axis=1)
+        rows.append({**config, **_summary(portfolio_value, capital_base),
+                     'n_trades': n_trades, 'total_cost': total_cost})
+
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).sort_values(sort_by, ascending=False, ignore_index=True)
+
+
+def deviation_report(approx, perf):
+    """比較近似回測與 zipline perf 的差距
+
+    Args:
+        approx: simulate_rotation 的結果
+        perf: run_algorithm 回傳的 perf DataFrame
+
+    Returns:
+        Series: 期末報酬 (近似 / zipline / 差距)、累積報酬最大絕對差、
+                日報酬差的年化追蹤誤差與相關係數
+    """
+    zipline_returns = perf['returns'].copy()
+    zipline_returns.index = _session_dates(zipline_returns.index).normalize()
+    approx_returns = approx['returns'].copy()
+    approx_returns.index = _session_dates(approx_returns.index).normalize()
+    both = pd.concat([approx_returns, zipline_returns], axis=1, keys=['approx', 'zipline'], join='inner')
+
+    cumulative = (1 + both).cumprod() - 1
+    diff = both['approx'] - both['zipline']
+    return pd.Series({
+        'final_return_approx': cumulative['approx'].iloc[-1],
+        'final_return_zipline': cumulative['zipline'].iloc[-1],
+        'final_return_diff': cumulative['approx'].iloc[-1] - cumulative['zipline'].iloc[-1],
+        'max_abs_return_diff': (cumulative['approx'] - cumulative['zipline']).abs().max(),
+        'tracking_error': diff.std() * np.sqrt(TRADING_DAYS),
+        'correlation': both['approx'].corr(both['zipline']),
+        'n_days': len(both),
+    })
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""data_align 測試 - 不同日期解析度 (奈秒 / 微秒) 混用時的 as-of 對齊"""
+
+import numpy as np
+import pandas as pd
+
+from data_align import asof_align, to_int64_dates
+
+
+def test_to_int64_dates_uses_nanoseconds():
+    dates = pd.DatetimeIndex(['2024-01-02', '2024-01-03'])
+    assert (to_int64_dates(dates.as_unit('us')) == to_int64_dates(dates.as_unit('ns'))).all()
+
+
+def test_asof_align_mixed_units():
+    data = pd.Series([1.0, 2.0, 3.0], index=pd.DatetimeIndex(['2024-01-01', '2024-01-03', '2024-01-08']).as_unit('us'))
+    index = pd.DatetimeIndex(['2024-01-03', '2024-01-05', '2024-01-09']).as_unit('ns')
+
+    aligned = asof_align(index, data)
+    np.testing.assert_array_equal(aligned.to_numpy(), [2.0, 2.0, 3.0])
+
+    # max_staleness 以奈秒比較，不受資料解析度影響
+    stale = asof_align(index, data, max_staleness=pd.Timedelta(days=1))
+    np.testing.assert_array_equal(stale.to_numpy(), [2.0, np.nan, 3.0])
+    exact = asof_align(index, data, max_staleness=pd.Timedelta(0))
+    np.testing.assert_array_equal(exact.to_numpy(), [2.0, np.nan, np.nan])
+
+    # 反過來 (目標為微秒、資料為奈秒) 結果相同
+    swapped = asof_align(index.as_unit('us'), data.set_axis(data.index.as_unit('ns')))
+    np.testing.assert_array_equal(swapped.to_numpy(), aligned.to_numpy())
+
+
+def test_asof_align_empty_data():
+    index = pd.DatetimeIndex(['2024-01-03', '2024-01-05'])
+    empty = pd.Series([], dtype=float, index=pd.DatetimeIndex([]))
+
+    aligned = asof_align(index, empty, max_staleness=pd.Timedelta(0))
+    assert aligned.index.equals(index) and aligned.isna().all()
+
+    frame = asof_align(index, pd.DataFrame({'close': empty}), lag=1)
+    assert frame.index.equals(index) and list(frame.columns) == ['close'] and frame.isna().all().all()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""tmba_pure_strategy_fixed 測試 - 向量化、批次與增量更新回測必須與逐筆迴圈結果一致 (合成資料)"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_providers import SyntheticDataProvider
+from tmba_pure_strategy_fixed import (PureStrategyConfig, PureRetailSentimentStrategy,
+                                      BatchRetailSentimentStrategy)
+
+SIGNAL_THRESHOLDS = (0.0, 0.02, 0.05)
+EXIT_SIGNAL_THRESHOLDS = (0.0, 0.03, 0.01)
+
+
+@pytest.fixture(scope='module')
+def data():
+    provider = SyntheticDataProvider(start='2018-01-01', end='2020-12-31', seed=7)
+    close = provider.get_continues_futures_price('TX', field='close').iloc[:, 0]
+    sentiment = provider.retail_long_short_ratio('MTX').reindex(close.index)
+    return pd.DataFrame({'close': close, 'sentiment_ratio': sentiment})
+
+
+def _strategy(signal_threshold, exit_signal_threshold, position_size=1):
+    config = PureStrategyConfig(position_size=position_size, signal_threshold=signal_threshold,
+                                exit_signal_threshold=exit_signal_threshold)
+    return PureRetailSentimentStrategy(config)
+
+
+@pytest.mark.parametrize('signal_threshold, exit_signal_threshold', zip(SIGNAL_THRESHOLDS, EXIT_SIGNAL_THRESHOLDS))
+def test_vectorized_matches_loop(data, signal_threshold, exit_signal_threshold):
+    loop = _strategy(signal_threshold, exit_signal_threshold)
+    vectorized = _strategy(signal_threshold, exit_signal_threshold)
+    expected = loop.run_backtest(data)
+    result = vectorized.run_backtest(data, vectorized=True, verbose=False)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_freq=False)
+    assert len(vectorized.trades) == len(loop.trades) > 0
+    pd.testing.assert_frame_equal(pd.DataFrame(vectorized.trades), pd.DataFrame(loop.trades), check_dtype=False)
+    for key in ('position', 'entry_price', 'cumulative_realized_pnl', 'market_value', 'equity_value'):
+        assert getattr(vectorized, key) == pytest.approx(getattr(loop, key))
+
+
+def test_batch_matches_single_runs(data):
+    batch = BatchRetailSentimentStrategy(SIGNAL_THRESHOLDS, EXIT_SIGNAL_THRESHOLDS, position_sizes=(1, 2, 1))
+    results = batch.run_backtest(data, verbose=False)
+
+    for k, (signal_threshold, exit_signal_threshold, position_size) in enumerate(batch.param_index()):
+        single = _strategy(signal_threshold, exit_signal_threshold, position_size).run_backtest(
+            data, vectorized=True, verbose=False)
+        np.testing.assert_allclose(results['market_value'].iloc[:, k], single['market_value'], rtol=1e-12)
+        np.testing.assert_allclose(results['equity_value'].iloc[:, k], single['equity_value'], rtol=1e-12)
+        np.testing.assert_array_equal(results['position'].iloc[:, k], single['position'])
+        assert results['summary']['final_market_value'].iloc[k] == pytest.approx(single['market_value'].iloc[-1])
+
+
+def test_chained_updates_match_full_run(data, tmp_path):
+    full = _strategy(0.02, 0.03).run_backtest(data, vectorized=True, verbose=False)
+
+    first, second, third = np.array_split(np.arange(len(data)), 3)
+    strategy = _strategy(0.02, 0.03)
+    pieces = [strategy.run_backtest(data.iloc[first], vectorized=True, verbose=False)]
+    for part in (second, third):
+        state_path = tmp_path / 'state.json'
+        strategy.save_state(state_path)
+        strategy = _strategy(0.02, 0.03).load_state(state_path)
+        # 與既有期間重疊的資料應被略過
+        pieces.append(strategy.update(data.iloc[part[0] - 5:part[-1] + 1], verbose=False))
+
+    pd.testing.assert_frame_equal(pd.concat(pieces), full, check_freq=False)
@@ -11,9 +11,17 @@ import numpy as np
 import matplotlib.pyplot as plt
 import warnings
 import os
-import sys
-import subprocess
+import itertools
+import json
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from matplotlib.font_manager import FontProperties
+from data_cache import cached_call, cached_date_range
+from bundle_ingest import ensure_bundle
+from data_loader import fetch_concurrently
+from data_providers import get_data_provider
+from data_align import asof_align
 
 warnings.filterwarnings('ignore')
 
@@ -30,6 +38,14 @@ INITIAL_CAPITAL = 1_000_000  # 初始資金 (TWD)
 START_DATE = '2013-01-01'  # 策略開始日期 (受散戶情緒數據限制)
 SPLIT_DATE = '2020-01-01'  # 樣本內外分割線
 END_DATE = '2025-06-30'  # 策略結束日期
+VECTORIZED_BACKTEST = True  # 回測引擎 (True: NumPy向量化, False: 逐筆迴圈，兩者輸出一致)
+LOAD_OHLCV = True  # 載入真實開高低收量 (False: 只載入收盤價，開高低以 ±0.5% 推估、成交量固定)
+OHLCV_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+PRICE_DTYPE = np.float32  # 價格欄位型別 (需要完整精度時改為 np.float64)
+AUTO_INGEST = True  # 執行 main() 時檢查 bundle，只 ingest 缺少的標的/日期
+USE_DATA_CACHE = True  # 資料快取 (Parquet，價格增量更新；散戶多空比依 bundle / 時效失效)
+SENTIMENT_CACHE_MAX_AGE = 12 * 3600  # 散戶多空比快取有效秒數 (TEJ API 資料不隨 bundle 更新)
+SENTIMENT_MAX_STALENESS = None  # 散戶多空比最長沿用時間 (如 pd.Timedelta(days=5))，None 表示一律沿用最近一筆
 
 print(f"🔧 當前參數設定：")
 print(f"   持倉口數: {POSITION_SIZE}口 (風險暴露: {POSITION_SIZE}倍)")
@@ -47,18 +63,18 @@ os.environ['future'] = 'TX MTX'
 os.environ['mdate'] = '20100101 20250630'
 
 class PureStrategyConfig:
-    """純策略配置"""
-    def __init__(self):
+    """純策略配置 (未指定的參數使用全域參數，參數掃描時可逐一覆寫)"""
+    def __init__(self, position_size=None, signal_threshold=None, exit_signal_threshold=None):
         # 使用全域參數
         self.start_date = START_DATE
         self.split_date = SPLIT_DATE
         self.end_date = END_DATE
         self.initial_capital = INITIAL_CAPITAL
-        self.position_size = POSITION_SIZE  # 改為使用全域參數
+        self.position_size = POSITION_SIZE if position_size is None else position_size
 
         # 策略信號閾值
-        self.signal_threshold = SIGNAL_THRESHOLD  # 使用全域參數
-        self.exit_signal_threshold = EXIT_SIGNAL_THRESHOLD  # 使用全域參數
+        self.signal_threshold = SIGNAL_THRESHOLD if signal_threshold is None else signal_threshold
+        self.exit_signal_threshold = EXIT_SIGNAL_THRESHOLD if exit_signal_threshold is None else exit_signal_threshold
 
 print("=== 台指期貨散戶多空比情緒指標策略 - 純策略版本 (修復版) ===")
 print("移除所有風險控制機制，探討最純粹的策略效果")
@@ -70,33 +86,22 @@ print(f"📊 當前配置：{POSITION_SIZE}口標準化1元 (可調整 POSITION_
 print(f"🎯 進場條件：散戶情緒 < {SIGNAL_THRESHOLD}")
 print(f"🎯 出場條件：散戶情緒 > {EXIT_SIGNAL_THRESHOLD}")
 
-# ==================== 執行zipline ingest ====================
+# ==================== 資料來源 ====================
+# 環境變數 TQUANT_DATA_PROVIDER 選擇：tquant (預設，TEJ/zipline) / local (本地檔案) / synthetic (合成資料，離線測試用)
 try:
-    # 執行zipline ingest
-    result = subprocess.run([sys.executable, '-m', 'zipline', 'ingest', '-b', 'tquant_future'], 
-                          capture_output=True, text=True, cwd='/Users/lixiangwei/Desktop/python_tqlabw')
-    print("Zipline ingest 執行完成")
-    if result.returncode != 0:
-        print(f"Zipline ingest 警告: {result.stderr}")
-except Exception as e:
-    print(f"執行zipline ingest時發生錯誤: {e}")
-
-# ==================== 導入真實數據模組 ====================
-try:
-    from zipline.TQresearch.futures_price import get_continues_futures_price
-    from zipline.TQresearch.futures_package import retail_long_short_ratio
-    ZIPLINE_AVAILABLE = True
-    print("zipline模組導入成功")
-except ImportError:
-    print("zipline模組未安裝，程式將終止。")
-    print("請確保已安裝zipline和相關的TQresearch模組。")
-    ZIPLINE_AVAILABLE = False
-    sys.exit(1)
+    DATA_PROVIDER = get_data_provider()
+    print(f"資料來源: {DATA_PROVIDER.name}")
+except ImportError as e:
+    print(f"⚠️  {e}")
+    DATA_PROVIDER = None
 
 # 1. 載入真實數據
-def load_real_data():
-    """載入真實的市場數據和散戶情緒數據"""
-    print("載入真實TEJ數據...")
+def load_real_data(provider=None):
+    """載入市場數據和散戶情緒數據 (provider 預設為 DATA_PROVIDER)"""
+    provider = DATA_PROVIDER if provider is None else provider
+    if provider is None:
+        raise RuntimeError("沒有可用的資料來源，請安裝 zipline 或設定 TQUANT_DATA_PROVIDER=synthetic / local")
+    print(f"載入真實TEJ數據... (資料來源: {provider.name})")
     
     # 設定時間範圍 - 情緒指標數據從2013年開始
     start_date = START_DATE
@@ -111,16 +116,58 @@ def load_real_data():
         print("  ⚠️  注意: 絕對價格水準有偏差 (約27%)")
         print("  💡 用途: 策略績效比較，非價格水準分析")
         
-        price_data = get_continues_futures_price(
-            root_symbol='TX',
-            offset=0,
-            roll_style='calendar',
-            adjustment= 'mul',  # 使用乘法調整   
-            field='close',
-            start_dt=start_date,
-            end_dt=end_date,
-            bundle='tquant_future'
-        )
+        def fetch_field(field):
+            # 成交量不做價格調整
+            adjustment = None if field == 'volume' else 'mul'  # 使用乘法調整
+            
+            def fetch(start, end):
+                return provider.get_continues_futures_price(
+                    root_symbol='TX',
+                    offset=0,
+                    roll_style='calendar',
+                    adjustment=adjustment,
+                    field=field,
+                    start_dt=start,
+                    end_dt=end,
+                    bundle='tquant_future'
+                )
+            
+            if USE_DATA_CACHE:
+                # 增量快取：只抓快取之後的新交易日；換月導致調整後價格整段重算或 bundle 重新 ingest 時自動完整重抓
+                return cached_date_range(f'{provider.name}: TX {field} offset=0 calendar {adjustment} @tquant_future', fetch,
+                                         start_date, end_date, date_column=None, validate_overlap=True,
+                                         bundle='tquant_future')
+            return fetch(start_date, end_date)
+        
+        def load_sentiment():
+            # retail_long_short_ratio 沒有日期參數，無法增量抓取，只能整份快取
+            if USE_DATA_CACHE:
+                return cached_call(provider.retail_long_short_ratio, max_age=SENTIMENT_CACHE_MAX_AGE, root_symbol='MTX')
+            return provider.retail_long_short_ratio(root_symbol='MTX')
+        
+        # 各價格欄位與散戶多空比彼此獨立，並行載入 (連續月價格每次只能取一個欄位)
+        fields = OHLCV_FIELDS if LOAD_OHLCV else ('close',)
+        print(f"正在並行載入台指期貨 {'/'.join(fields)} 與散戶多空比數據...")
+        tasks = {f'台指期貨 {field}': (lambda field=field: fetch_field(field)) for field in fields}
+        tasks['散戶多空比'] = load_sentiment
+        loaded = fetch_concurrently(tasks)
+        sentiment_data = loaded['散戶多空比']
+        
+        if LOAD_OHLCV:
+            missing = [field for field in fields if loaded[f'台指期貨 {field}'] is None or loaded[f'台指期貨 {field}'].empty]
+            if missing:
+                raise ValueError(f"無法載入台指期貨 {', '.join(missing)} 數據")
+            
+            def as_series(data):
+                return data.iloc[:, 0] if isinstance(data, pd.DataFrame) else data
+            
+            close = as_series(loaded['台指期貨 close'])
+            price_data = pd.DataFrame(
+                {field: as_series(loaded[f'台指期貨 {field}']).reindex(close.index) for field in ('close', 'open', 'high', 'low', 'volume')},
+                index=close.index
+            )
+        else:
+            price_data = loaded['台指期貨 close']
         
         if price_data is None or price_data.empty:
             raise ValueError("無法載入台指期貨價格數據")
@@ -158,10 +205,7 @@ def load_real_data():
         
         print(f"轉換後價格數據欄位: {list(price_data.columns)}")
         
-        # 載入散戶多空比數據
-        print("正在載入散戶多空比數據...")
-        sentiment_data = retail_long_short_ratio(root_symbol='MTX')
-        
+        # 檢查散戶多空比數據
         if sentiment_data is None or sentiment_data.empty:
             raise ValueError("無法載入散戶多空比數據")
         
@@ -175,19 +219,19 @@ def load_real_data():
         
         if isinstance(sentiment_data, pd.Series):
             # 重新索引散戶情緒數據以匹配價格數據
-            sentiment_aligned = sentiment_data.reindex(price_data.index, method='ffill')
+            sentiment_aligned = asof_align(price_data.index, sentiment_data, max_staleness=SENTIMENT_MAX_STALENESS)
             combined_data['sentiment_ratio'] = sentiment_aligned
         else:
             # 如果是DataFrame，嘗試找到合適的欄位
             if 'ratio' in sentiment_data.columns:
-                sentiment_aligned = sentiment_data['ratio'].reindex(price_data.index, method='ffill')
+                sentiment_aligned = asof_align(price_data.index, sentiment_data['ratio'], max_staleness=SENTIMENT_MAX_STALENESS)
                 combined_data['sentiment_ratio'] = sentiment_aligned
             else:
                 print("警告：散戶多空比數據中找不到'ratio'欄位")
                 # 使用第一個數值欄位作為替代
                 numeric_cols = sentiment_data.select_dtypes(include=[np.number]).columns
                 if len(numeric_cols) > 0:
-                    sentiment_aligned = sentiment_data[numeric_cols[0]].reindex(price_data.index, method='ffill')
+                    sentiment_aligned = asof_align(price_data.index, sentiment_data[numeric_cols[0]], max_staleness=SENTIMENT_MAX_STALENESS)
                     combined_data['sentiment_ratio'] = sentiment_aligned
                     print(f"使用欄位 '{numeric_cols[0]}' 作為散戶多空比")
                 else:
@@ -199,6 +243,13 @@ def load_real_data():
         if combined_data.empty:
             raise ValueError("合併後的數據為空")
         
+        # 緊湊型別：價格 float32 (可改 PRICE_DTYPE)、成交量 int32、散戶多空比 float32；回測計算時再轉 float64
+        combined_data = combined_data.astype({
+            'open': PRICE_DTYPE, 'high': PRICE_DTYPE, 'low': PRICE_DTYPE, 'close': PRICE_DTYPE,
+            'volume': np.int32, 'sentiment_ratio': np.float32
+        })
+        print(f"💾 每筆記錄 {combined_data.memory_usage(index=False).sum() / len(combined_data):.0f} bytes (不含日期索引)")
+        
         print(f"真實數據載入完成: {len(combined_data)} 筆有效記錄")
         print(f"數據時間範圍: {combined_data.index[0]} 到 {combined_data.index[-1]}")
         
@@ -206,8 +257,103 @@ def load_real_data():
         
     except Exception as e:
         print(f"載入真實數據時發生錯誤: {e}")
-        print("程式將終止，請檢查數據源設定")
-        sys.exit(1)
+        print("請檢查數據源設定")
+        raise RuntimeError(f"載入數據失敗 (資料來源: {provider.name})") from e
+
+class EquityCurve:
+    """欄位式曲線容器 - 以預先配置的 float64 / int8 陣列取代逐日 dict 串列
+
+    每個欄位為一個連續的 NumPy 陣列，可零拷貝轉為 pandas DataFrame，
+    並可存成 .npz 或 Parquet；保存大量參數掃描曲線時記憶體用量遠小於 list-of-dicts。
+    """
+
+    # 情緒策略曲線欄位
+    STRATEGY_COLUMNS = {
+        'market_value': np.float64,
+        'equity_value': np.float64,
+        'daily_market_return': np.float64,
+        'daily_equity_return': np.float64,
+        'price': np.float64,
+        'sentiment': np.float64,
+        'position': np.int8,
+        'cumulative_pnl': np.float64
+    }
+    # Buy & Hold 基準曲線欄位
+    BENCHMARK_COLUMNS = {
+        'market_value': np.float64,
+        'equity_value': np.float64,
+        'daily_market_return': np.float64,
+        'daily_equity_return': np.float64,
+        'tx_price': np.float64
+    }
+
+    def __init__(self, dates, columns=None):
+        """依日期數量預先配置各欄位陣列 (初始為0)"""
+        self.dates = pd.Index(dates).rename('date')
+        self.columns = dict(self.STRATEGY_COLUMNS if columns is None else columns)
+        self.data = {name: np.zeros(len(self.dates), dtype=dtype) for name, dtype in self.columns.items()}
+
+    @classmethod
+    def from_arrays(cls, dates, columns=None, **arrays):
+        """由既有陣列建立 (dtype 相符時不複製)"""
+        curve = cls.__new__(cls)
+        curve.dates = pd.Index(dates).rename('date')
+        curve.columns = dict(cls.STRATEGY_COLUMNS if columns is None else columns)
+        curve.data = {name: np.asarray(arrays[name]).astype(dtype, copy=False)
+                      for name, dtype in curve.columns.items()}
+        return curve
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def set_row(self, i, **values):
+        """寫入第 i 個交易日的數值"""
+        for name, value in values.items():
+            self.data[name][i] = value
+
+    def row(self, i):
+        """取得第 i 個交易日的數據 (dict)"""
+        return {'date': self.dates[i], **{name: column[i].item() for name, column in self.data.items()}}
+
+    @property
+    def nbytes(self):
+        """曲線數據佔用的位元組數"""
+        return sum(column.nbytes for column in self.data.values()) + self.dates.nbytes
+
+    def to_frame(self):
+        """零拷貝轉為 DataFrame (與容器共用記憶體)"""
+        return pd.DataFrame(self.data, index=self.dates, copy=False)
+
+    def save_npz(self, path):
+        """存成 .npz (日期以 UTC datetime64[ns] 保存，另存時區)"""
+        tz = getattr(self.dates, 'tz', None)
+        np.savez(path, date=self.dates.values.astype('datetime64[ns]'),
+                 tz=np.array('' if tz is None else str(tz)), **self.data)
+
+    @classmethod
+    def load_npz(cls, path, columns=None):
+        """讀取 save_npz 保存的曲線"""
+        with np.load(path) as npz:
+            dates = pd.DatetimeIndex(npz['date'])
+            tz = str(npz['tz'])
+            if tz:
+                dates = dates.tz_localize('UTC').tz_convert(tz)
+            names = columns or {name: npz[name].dtype.type for name in npz.files if name not in ('date', 'tz')}
+            return cls.from_arrays(dates, columns=names, **{name: npz[name] for name in names})
+
+    def save_parquet(self, path):
+        """存成 Parquet"""
+        self.to_frame().to_parquet(path)
+
+    @classmethod
+    def load_parquet(cls, path, columns=None):
+        """讀取 save_parquet 保存的曲線"""
+        df = pd.read_parquet(path)
+        names = columns or {name: df[name].dtype.type for name in df.columns}
+        return cls.from_arrays(df.index, columns=names, **{name: df[name].to_numpy() for name in names})
 
 class PureRetailSentimentStrategy:
     """純散戶情緒策略（移除所有風險控制）- 市值曲線 vs 權益曲線 - 單利計算版本"""
@@ -225,7 +371,8 @@ class PureRetailSentimentStrategy:
         
         # 交易記錄
         self.trades = []
-        self.equity_curve = []
+        self.equity_curve = None  # EquityCurve (回測後設定)
+        self.last_curve_row = None  # 最後一筆曲線數據 (增量更新的續算起點)
         
     def generate_signal(self, sentiment_value):
         """生成交易信號（只基於散戶情緒）"""
@@ -240,8 +387,17 @@ class PureRetailSentimentStrategy:
         # 這個方法現在只負責記錄交易狀態，市值計算在run_backtest中統一處理
         pass  # 交易邏輯已移到run_backtest方法中
     
-    def run_backtest(self, data):
-        """執行回測 - 正確實現市值曲線與權益曲線的區別"""
+    def run_backtest(self, data, vectorized=False, verbose=True):
+        """執行回測 - 正確實現市值曲線與權益曲線的區別
+
+        Args:
+            data: 含 close 與 sentiment_ratio 欄位的合併數據
+            vectorized: True 時改用 run_backtest_vectorized (輸出欄位與數值與逐筆迴圈一致)
+            verbose: 向量化版本是否列印回測摘要 (參數掃描時關閉)
+        """
+        if vectorized:
+            return self.run_backtest_vectorized(data, verbose=verbose)
+
         print(f"\n=== 開始純策略回測 (市值曲線 vs 權益曲線) ===")
         
         # 使用已合併的數據
@@ -254,6 +410,8 @@ class PureRetailSentimentStrategy:
         print(f"💡 計算方式：單利累積（{self.config.position_size}口標準化1元）")
         print("⚠️  風險控制: 已全部移除 (無停損、停利、時間停損)")
         
+        curve = EquityCurve(combined_data.index)
+
         for i, (date, row) in enumerate(combined_data.iterrows()):
             price = row['close']
             sentiment = row['sentiment_ratio']
@@ -309,148 +467,461 @@ class PureRetailSentimentStrategy:
             
             # 計算日報酬率
             if i > 0:
-                daily_market_return = (self.market_value / self.equity_curve[-1]['market_value']) - 1
-                daily_equity_return = (self.equity_value / self.equity_curve[-1]['equity_value']) - 1
+                daily_market_return = (self.market_value / curve['market_value'][i - 1]) - 1
+                daily_equity_return = (self.equity_value / curve['equity_value'][i - 1]) - 1
             else:
                 daily_market_return = 0
                 daily_equity_return = 0
             
             # 記錄曲線數據
-            self.equity_curve.append({
-                'date': date,
-                'market_value': self.market_value,
-                'equity_value': self.equity_value,
-                'daily_market_return': daily_market_return,
-                'daily_equity_return': daily_equity_return,
-                'price': price,
-                'sentiment': sentiment,
-                'position': self.position,
-                'cumulative_pnl': self.cumulative_realized_pnl
-            })
-        
-        # 轉換為DataFrame
-        equity_df = pd.DataFrame(self.equity_curve)
-        equity_df.set_index('date', inplace=True)
+            curve.set_row(i,
+                          market_value=self.market_value,
+                          equity_value=self.equity_value,
+                          daily_market_return=daily_market_return,
+                          daily_equity_return=daily_equity_return,
+                          price=price,
+                          sentiment=sentiment,
+                          position=self.position,
+                          cumulative_pnl=self.cumulative_realized_pnl)
+        
+        # 轉換為DataFrame (零拷貝)
+        self.equity_curve = curve
+        equity_df = curve.to_frame()
+        self.last_curve_row = curve.row(-1)
         
         print(f"成功生成 {len(equity_df)} 天的完整數據")
         print(f"最終市值: {equity_df.iloc[-1]['market_value']:.4f}")
         print(f"最終權益: {equity_df.iloc[-1]['equity_value']:.4f}")
         print(f"市值總報酬率: {(equity_df.iloc[-1]['market_value'] - 1) * 100:.2f}%")
         print(f"權益總報酬率: {(equity_df.iloc[-1]['equity_value'] - 1) * 100:.2f}%")
-        
+
         return equity_df
 
+    def run_backtest_vectorized(self, data, verbose=True):
+        """執行回測 - NumPy 向量化版本
+
+        以陣列運算取代逐筆迴圈：先由情緒指標產生帶遲滯的持倉陣列，
+        再一次推導進場價、已實現損益、市值曲線與權益曲線。
+        輸出欄位與數值與 run_backtest 逐筆迴圈版本一致，不逐筆列印交易。
+        """
+        if verbose:
+            print(f"\n=== 開始純策略回測 (向量化, 市值曲線 vs 權益曲線) ===")
+            print(f"回測期間: {data.index[0]} ~ {data.index[-1]}")
+            print(f"共同交易日期數: {len(data)}")
+
+        equity_df, n_entries, n_exits = self._advance(data)
+
+        if verbose:
+            print(f"共 {n_entries} 次進場、{n_exits} 次出場")
+            print(f"成功生成 {len(equity_df)} 天的完整數據")
+            print(f"最終市值: {equity_df.iloc[-1]['market_value']:.4f}")
+            print(f"最終權益: {equity_df.iloc[-1]['equity_value']:.4f}")
+            print(f"市值總報酬率: {(equity_df.iloc[-1]['market_value'] - 1) * 100:.2f}%")
+            print(f"權益總報酬率: {(equity_df.iloc[-1]['equity_value'] - 1) * 100:.2f}%")
+
+        return equity_df
+
+    def _advance(self, data, prev_market_value=None, prev_equity_value=None):
+        """由目前策略狀態向量化推進 data 中的每個交易日，並同步更新策略狀態
+
+        Args:
+            data: 含 close 與 sentiment_ratio 欄位的數據
+            prev_market_value / prev_equity_value: 前一交易日的市值與權益，
+                用於計算第一天的日報酬率；None 時第一天日報酬率為0 (同逐筆迴圈)
+
+        Returns:
+            tuple: (曲線 DataFrame, 進場次數, 出場次數)
+        """
+        prices = data['close'].to_numpy(dtype=np.float64)
+        sentiment = data['sentiment_ratio'].to_numpy(dtype=np.float64)
+        position_size = self.config.position_size
+        n = len(prices)
+        bars = np.arange(n)
+
+        initial_in_position = self.position > 0
+        initial_entry_price = self.entry_price
+
+        # === 信號與持倉 (遲滯：持倉狀態沿用最近一次 buy/sell 信號) ===
+        buy = sentiment < -self.config.signal_threshold
+        sell = (sentiment > self.config.exit_signal_threshold) & ~buy
+        last_signal_bar = np.maximum.accumulate(np.where(buy | sell, bars, -1))
+        in_position = np.where(last_signal_bar >= 0, buy[np.maximum(last_signal_bar, 0)], initial_in_position)
+
+        prev_in_position = np.concatenate(([initial_in_position], in_position[:-1]))
+        entries = in_position & ~prev_in_position
+        exits = ~in_position & prev_in_position
+
+        # === 進場價 (持倉期間沿用進場當日價格，無持倉為0) ===
+        entry_bar = np.maximum.accumulate(np.where(entries, bars, -1))
+        held_entry_price = np.where(entry_bar >= 0, prices[np.maximum(entry_bar, 0)], initial_entry_price)
+        entry_price = np.where(in_position, held_entry_price, 0.0)
+
+        # === 已實現損益 (單利累積，只在出場日實現) ===
+        exit_bars = np.flatnonzero(exits)
+        prev_entry_price = np.concatenate(([initial_entry_price], entry_price[:-1]))
+        exit_entry_price = prev_entry_price[exit_bars]
+        trade_returns = (prices[exit_bars] - exit_entry_price) / exit_entry_price * position_size
+        realized_pnl = np.zeros(n + 1)
+        realized_pnl[0] = self.cumulative_realized_pnl
+        realized_pnl[exit_bars + 1] = trade_returns
+        cumulative_pnl = np.cumsum(realized_pnl)[1:]
+
+        # === 市值曲線 (含未實現損益) 與權益曲線 (只在平倉時更新) ===
+        safe_entry_price = np.where(in_position, entry_price, 1.0)
+        unrealized_return = (prices - safe_entry_price) / safe_entry_price * position_size
+        market_value = np.where(in_position, 1.0 + cumulative_pnl + unrealized_return, 1.0 + cumulative_pnl)
+        equity_value = 1.0 + cumulative_pnl
+
+        daily_market_return = np.zeros(n)
+        daily_equity_return = np.zeros(n)
+        daily_market_return[1:] = market_value[1:] / market_value[:-1] - 1
+        daily_equity_return[1:] = equity_value[1:] / equity_value[:-1] - 1
+        if prev_market_value is not None:
+            daily_market_return[0] = market_value[0] / prev_market_value - 1
+            daily_equity_return[0] = equity_value[0] / prev_equity_value - 1
+
+        curve = EquityCurve.from_arrays(
+            data.index,
+            market_value=market_value,
+            equity_value=equity_value,
+            daily_market_return=daily_market_return,
+            daily_equity_return=daily_equity_return,
+            price=prices,
+            sentiment=sentiment,
+            position=np.where(in_position, position_size, 0),
+            cumulative_pnl=cumulative_pnl
+        )
+        self.equity_curve = curve
+        equity_df = curve.to_frame()
+
+        # 同步策略狀態與交易記錄 (與逐筆迴圈結束時一致)
+        dates = data.index
+        for k, bar in enumerate(exit_bars):
+            self.trades.append({
+                'entry_price': exit_entry_price[k],
+                'exit_date': dates[bar],
+                'exit_price': prices[bar],
+                'trade_return': trade_returns[k],
+                'cumulative_pnl': cumulative_pnl[bar],
+                'equity_value': equity_value[bar]
+            })
+        self.position = position_size if in_position[-1] else 0
+        self.entry_price = entry_price[-1] if in_position[-1] else 0
+        self.cumulative_realized_pnl = cumulative_pnl[-1]
+        self.market_value = market_value[-1]
+        self.equity_value = equity_value[-1]
+        self.last_curve_row = curve.row(-1)
+
+        return equity_df, int(entries.sum()), len(exit_bars)
+
+    def get_state(self):
+        """取得可序列化的策略狀態 (供每日增量更新續算)"""
+        if self.last_curve_row is None:
+            raise ValueError("尚無回測狀態，請先執行 run_backtest 或 load_state")
+        last_row = {key: (value.isoformat() if isinstance(value, pd.Timestamp) else float(value))
+                    for key, value in self.last_curve_row.items()}
+        return {
+            'signal_threshold': float(self.config.signal_threshold),
+            'exit_signal_threshold': float(self.config.exit_signal_threshold),
+            'position_size': self.config.position_size,
+            'position': int(self.position),
+            'entry_price': float(self.entry_price),
+            'cumulative_realized_pnl': float(self.cumulative_realized_pnl),
+            'market_value': float(self.market_value),
+            'equity_value': float(self.equity_value),
+            'last_curve_row': last_row
+        }
+
+    def save_state(self, path):
+        """將策略狀態存為 JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_state(), f, ensure_ascii=False, indent=2)
+        print(f"策略狀態已保存：{path} (最後日期 {self.last_curve_row['date']})")
+
+    def load_state(self, path):
+        """由 JSON 還原策略狀態 (參數需與目前配置一致)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        for key in ('signal_threshold', 'exit_signal_threshold', 'position_size'):
+            if state[key] != getattr(self.config, key):
+                raise ValueError(f"策略狀態參數 {key}={state[key]} 與目前配置 {getattr(self.config, key)} 不一致")
+
+        self.position = state['position']
+        self.entry_price = state['entry_price']
+        self.cumulative_realized_pnl = state['cumulative_realized_pnl']
+        self.market_value = state['market_value']
+        self.equity_value = state['equity_value']
+        self.last_curve_row = dict(state['last_curve_row'])
+        self.last_curve_row['date'] = pd.Timestamp(self.last_curve_row['date'])
+        return self
+
+    def update(self, new_bars, curve_path=None, verbose=True):
+        """增量更新：只推進最後已知日期之後的新交易日 (O(新交易日數))
+
+        Args:
+            new_bars: 含 close 與 sentiment_ratio 欄位的新數據 (可與既有期間重疊，重疊部分略過)
+            curve_path: 持久化曲線 CSV 路徑，提供時將新曲線附加至檔尾
+            verbose: 是否列印更新摘要
+
+        Returns:
+            DataFrame: 新增交易日的曲線 (欄位同 run_backtest)
+        """
+        if self.last_curve_row is None:
+            raise ValueError("尚無回測狀態，請先執行 run_backtest 或 load_state")
+
+        last_date = self.last_curve_row['date']
+        new_bars = new_bars[new_bars.index > last_date]
+        if new_bars.empty:
+            if verbose:
+                print(f"無新交易日 (最後日期 {last_date})")
+            return new_bars.iloc[:0]
+
+        new_curve, n_entries, n_exits = self._advance(new_bars,
+                                                      prev_market_value=self.last_curve_row['market_value'],
+                                                      prev_equity_value=self.last_curve_row['equity_value'])
+
+        if curve_path is not None:
+            new_curve.to_csv(curve_path, mode='a', header=not os.path.exists(curve_path))
+
+        if verbose:
+            print(f"增量更新 {len(new_curve)} 個交易日 ({new_curve.index[0]} ~ {new_curve.index[-1]})，"
+                  f"進場 {n_entries} 次、出場 {n_exits} 次，最新市值 {self.market_value:.4f}")
+
+        return new_curve
+
+class BatchRetailSentimentStrategy:
+    """批次散戶情緒策略 - 單次時間迴圈同時回測 N 組閾值參數
+
+    交易規則與 PureRetailSentimentStrategy.run_backtest 相同，
+    但策略狀態 (持倉、進場價、累積已實現損益) 以長度 N 的陣列保存，
+    每個交易日只以一次 NumPy 運算更新全部參數組合，
+    Python 迴圈成本只需支付一次，而非每組參數一次。
+    """
+
+    def __init__(self, signal_thresholds, exit_signal_thresholds, position_sizes=POSITION_SIZE):
+        """
+        Args:
+            signal_thresholds: 進場閾值陣列 (N,)
+            exit_signal_thresholds: 出場閾值陣列 (N,)
+            position_sizes: 持倉口數，純量或 (N,) 陣列
+        """
+        self.signal_thresholds, self.exit_signal_thresholds, self.position_sizes = np.broadcast_arrays(
+            np.asarray(signal_thresholds, dtype=np.float64),
+            np.asarray(exit_signal_thresholds, dtype=np.float64),
+            np.asarray(position_sizes)
+        )
+        self.n_params = len(self.signal_thresholds)
+
+    def param_index(self):
+        """參數組合索引 (對應結果欄位)"""
+        return pd.MultiIndex.from_arrays(
+            [self.signal_thresholds, self.exit_signal_thresholds, self.position_sizes],
+            names=['signal_threshold', 'exit_signal_threshold', 'position_size']
+        )
+
+    def run_backtest(self, data, record_curves=True, verbose=True):
+        """執行批次回測
+
+        Args:
+            data: 含 close 與 sentiment_ratio 欄位的合併數據
+            record_curves: 是否保存 (時間 × 參數) 的完整曲線，
+                           參數組合極多時可關閉，只保留 summary 以節省記憶體
+            verbose: 是否列印回測摘要
+
+        Returns:
+            dict: 'summary' 為每組參數的期末市值/權益、交易次數與市值最大回撤；
+                  record_curves=True 時另含 'market_value'、'equity_value'、'position'
+                  三個寬表 (索引為日期，欄位為參數組合)
+        """
+        prices = data['close'].to_numpy(dtype=np.float64)
+        sentiment = data['sentiment_ratio'].to_numpy(dtype=np.float64)
+        n_bars, n_params = len(prices), self.n_params
+
+        if verbose:
+            print(f"\n=== 批次回測：{n_params} 組參數 × {n_bars} 個交易日 ===")
+
+        entry_threshold = -self.signal_thresholds
+        exit_threshold = self.exit_signal_thresholds
+        position_sizes = self.position_sizes
+
+        # 策略狀態 (每組參數一個元素)
+        in_position = np.zeros(n_params, dtype=bool)
+        entry_price = np.zeros(n_params)
+        cumulative_pnl = np.zeros(n_params)
+        peak_value = np.ones(n_params)
+        max_drawdown = np.zeros(n_params)
+        n_trades = np.zeros(n_params, dtype=np.int64)
+
+        if record_curves:
+            market_curve = np.empty((n_bars, n_params))
+            equity_curve = np.empty((n_bars, n_params))
+            position_curve = np.empty((n_bars, n_params), dtype=position_sizes.dtype)
+
+        for t in range(n_bars):
+            price = prices[t]
+            buy = sentiment[t] < entry_threshold
+            sell = (sentiment[t] > exit_threshold) & ~buy
+
+            entering = buy & ~in_position
+            exiting = sell & in_position
+
+            # 出場：實現損益 (單利累積)
+            safe_entry_price = np.where(in_position, entry_price, 1.0)
+            trade_return = (price - safe_entry_price) / safe_entry_price * position_sizes
+            cumulative_pnl = cumulative_pnl + np.where(exiting, trade_return, 0.0)
+            n_trades += exiting
+
+            # 進場與持倉狀態更新
+            entry_price = np.where(entering, price, np.where(exiting, 0.0, entry_price))
+            in_position = (in_position | entering) & ~exiting
+
+            # 市值曲線 (含未實現損益) 與權益曲線
+            safe_entry_price = np.where(in_position, entry_price, 1.0)
+            unrealized_return = (price - safe_entry_price) / safe_entry_price * position_sizes
+            market_value = np.where(in_position, 1.0 + cumulative_pnl + unrealized_return, 1.0 + cumulative_pnl)
+
+            peak_value = np.maximum(peak_value, market_value)
+            max_drawdown = np.minimum(max_drawdown, (market_value - peak_value) / peak_value)
+
+            if record_curves:
+                market_curve[t] = market_value
+                equity_curve[t] = 1.0 + cumulative_pnl
+                position_curve[t] = np.where(in_position, position_sizes, 0)
+
+        columns = self.param_index()
+        summary = pd.DataFrame({
+            'final_market_value': market_value,
+            'final_equity_value': 1.0 + cumulative_pnl,
+            'n_trades': n_trades,
+            'max_drawdown': max_drawdown * 100
+        }, index=columns)
+
+        results = {'summary': summary}
+        if record_curves:
+            index = data.index.rename('date')
+            results['market_value'] = pd.DataFrame(market_curve, index=index, columns=columns)
+            results['equity_value'] = pd.DataFrame(equity_curve, index=index, columns=columns)
+            results['position'] = pd.DataFrame(position_curve, index=index, columns=columns)
+
+        if verbose:
+            best_signal, best_exit, best_size = summary['final_market_value'].idxmax()
+            print(f"批次回測完成，最佳期末市值 {summary['final_market_value'].max():.4f} "
+                  f"(進場閾值 {best_signal:.4f}, 出場閾值 {best_exit:.4f}, {best_size}口)")
+
+        return results
+
+# Buy & Hold 基準曲線快取：(價格數據指紋, 持倉口數, 計算方式) -> 結果 DataFrame
+_BENCHMARK_CACHE = {}
+
+def _price_fingerprint(prices):
+    """價格序列指紋 (日期 + 價格內容的雜湊)"""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(prices.index.values).view(np.uint8))
+    digest.update(np.ascontiguousarray(prices.to_numpy(dtype=np.float64)).view(np.uint8))
+    return digest.hexdigest()
+
 class TXBuyAndHoldStrategy:
     """台指期貨 TX Buy and Hold 策略 - 同時計算市值曲線和權益曲線"""
     
-    def __init__(self, initial_capital):
+    def __init__(self, initial_capital, position_size=None):
         self.initial_capital = initial_capital
+        self.position_size = POSITION_SIZE if position_size is None else position_size
         
-    def run_backtest(self, data):
-        """執行 Buy and Hold 回測 - 市值曲線 vs 權益曲線"""
-        print(f"\n=== 執行台指期貨 TX Buy and Hold 策略 (市值曲線 vs 權益曲線) ===")
-        
-        # 使用與策略數據相同的時間範圍
-        start_date = data.index[0]
-        end_date = data.index[-1]
-        
-        print(f"台指期貨 Buy and Hold 期間: {start_date} 到 {end_date}")
-        print(f"買入價格: {data['close'].iloc[0]:.2f}")
-        print(f"賣出價格: {data['close'].iloc[-1]:.2f}")
-        print(f"💡 Buy & Hold: {POSITION_SIZE}口持倉，1元標準化（與情緒策略一致）")
-        print("💡 Buy & Hold: 市值曲線 = 權益曲線 (無策略調整)")
-        
-        # 使用真實的TX台指期貨價格數據
-        tx_prices = data['close'].copy()
-        
-        # 計算每日市值和權益（Buy & Hold下兩者相同）
-        equity_curve = []
-        cumulative_realized_pnl = 0.0  # 累積已實現損益（與情緒策略一致）
-        
-        for i, (date, price) in enumerate(tx_prices.items()):
-            if i == 0:
-                # 第一天
-                daily_market_return = 0
-                daily_equity_return = 0
-                market_value = 1.0
-                equity_value = 1.0
-            else:
-                # 計算日報酬率（N口標準化到1元，與情緒策略一致）
-                single_contract_return = (price / tx_prices.iloc[i-1]) - 1
-                total_return = single_contract_return * POSITION_SIZE  # N口總報酬
-                cumulative_realized_pnl += total_return  # 累積報酬
-                market_value = 1.0 + cumulative_realized_pnl  # 1元標準化
-                equity_value = 1.0 + cumulative_realized_pnl  # Buy & Hold下兩者相同
-                daily_market_return = total_return  # N口的日報酬
-                daily_equity_return = total_return  # 相同
-            
-            equity_curve.append({
-                'date': date,
-                'market_value': market_value,
-                'equity_value': equity_value,  # Buy & Hold: 市值 = 權益
-                'daily_market_return': daily_market_return,
-                'daily_equity_return': daily_equity_return,
-                'tx_price': price
-            })
-        
-        result_df = pd.DataFrame(equity_curve)
-        result_df.set_index('date', inplace=True)
-        
-        print(f"TX Buy and Hold 策略回測完成，共 {len(result_df)} 天")
-        print(f"最終市值: {result_df.iloc[-1]['market_value']:.4f}")
-        print(f"最終權益: {result_df.iloc[-1]['equity_value']:.4f}")
-        print(f"總報酬率: {(result_df.iloc[-1]['market_value'] - 1) * 100:.2f}%")
-        
-        return result_df
-        
+    def run_backtest(self, data, mode='simple', verbose=True):
+        """執行 Buy and Hold 回測 - 市值曲線 vs 權益曲線 (向量化，結果依價格數據快取)
+
+        Args:
+            data: 含 close 欄位的數據
+            mode: 'simple' 單利累積 (與情緒策略一致)；'compound' 複利累積
+            verbose: 是否列印回測摘要
+
+        相同價格數據、持倉口數與計算方式只計算一次，參數掃描時不會重複計算基準。
+        """
+        if mode not in ('simple', 'compound'):
+            raise ValueError(f"未知的計算方式: {mode} (可用: 'simple', 'compound')")
+
         # 使用真實的TX台指期貨價格數據
-        tx_prices = data['close'].copy()
-        
-        print(f"買入日期: {start_date}")
-        print(f"買入價格: {tx_prices.iloc[0]:.2f}")
-        print(f"賣出日期: {end_date}")
-        print(f"賣出價格: {tx_prices.iloc[-1]:.2f}")
-        print("💡 Buy & Hold: 市值曲線 = 權益曲線 (買入後持有到底)")
-        
-        # 計算每日市值和權益
-        equity_curve = []
-        market_value = 1.0  # 從1開始
-        equity_value = 1.0  # Buy & Hold策略中，權益曲線 = 市值曲線
-        
-        for i, (date, price) in enumerate(tx_prices.items()):
-            if i == 0:
-                # 第一天
-                market_daily_return = 0
-                equity_daily_return = 0
-                market_value = 1.0
-                equity_value = 1.0
+        tx_prices = data['close']
+        cache_key = (_price_fingerprint(tx_prices), self.position_size, mode)
+
+        if cache_key not in _BENCHMARK_CACHE:
+            prices = tx_prices.to_numpy(dtype=np.float64)
+
+            # 計算日報酬率（N口標準化到1元，與情緒策略一致）
+            daily_return = np.zeros(len(prices))
+            daily_return[1:] = ((prices[1:] / prices[:-1]) - 1) * self.position_size
+
+            if mode == 'simple':
+                # 單利：累積報酬相加
+                market_value = 1.0 + np.cumsum(daily_return)
             else:
-                # 計算日報酬率
-                daily_return = (price / tx_prices.iloc[i-1]) - 1
-                market_value = market_value * (1 + daily_return)
-                equity_value = equity_value * (1 + daily_return)  # Buy & Hold中兩者相同
-                market_daily_return = daily_return
-                equity_daily_return = daily_return
-            
-            equity_curve.append({
-                'date': date,
-                'market_value': market_value,
-                'equity_value': equity_value,
-                'market_daily_return': market_daily_return,
-                'equity_daily_return': equity_daily_return,
-                'tx_price': price
-            })
-        
-        result_df = pd.DataFrame(equity_curve)
-        result_df.set_index('date', inplace=True)
-        
-        print(f"TX Buy and Hold 策略回測完成，共 {len(result_df)} 天")
-        print(f"最終市值: {result_df.iloc[-1]['market_value']:.4f}")
-        print(f"最終權益: {result_df.iloc[-1]['equity_value']:.4f}")
-        print(f"總報酬率: {(result_df.iloc[-1]['market_value'] - 1) * 100:.2f}%")
-        
+                # 複利：累積報酬相乘
+                market_value = np.cumprod(1 + daily_return)
+
+            # Buy & Hold 下市值曲線 = 權益曲線
+            curve = EquityCurve.from_arrays(
+                tx_prices.index,
+                columns=EquityCurve.BENCHMARK_COLUMNS,
+                market_value=market_value,
+                equity_value=market_value,
+                daily_market_return=daily_return,
+                daily_equity_return=daily_return,
+                tx_price=prices
+            )
+            _BENCHMARK_CACHE[cache_key] = curve.to_frame()
+
+        result_df = _BENCHMARK_CACHE[cache_key].copy()
+
+        if verbose:
+            print(f"\n=== 執行台指期貨 TX Buy and Hold 策略 (市值曲線 vs 權益曲線, {'單利' if mode == 'simple' else '複利'}) ===")
+            print(f"台指期貨 Buy and Hold 期間: {data.index[0]} 到 {data.index[-1]}")
+            print(f"買入價格: {tx_prices.iloc[0]:.2f}")
+            print(f"賣出價格: {tx_prices.iloc[-1]:.2f}")
+            print(f"💡 Buy & Hold: {self.position_size}口持倉，1元標準化（與情緒策略一致）")
+            print("💡 Buy & Hold: 市值曲線 = 權益曲線 (無策略調整)")
+            print(f"TX Buy and Hold 策略回測完成，共 {len(result_df)} 天")
+            print(f"最終市值: {result_df.iloc[-1]['market_value']:.4f}")
+            print(f"最終權益: {result_df.iloc[-1]['equity_value']:.4f}")
+            print(f"總報酬率: {(result_df.iloc[-1]['market_value'] - 1) * 100:.2f}%")
+
         return result_df
 
+def _return_prefix_sums(values):
+    """建立日報酬率前綴和 (沿第 0 軸，支援 1-D / 2-D)
+
+    prefix[k] 為 returns[0:k] 的和，returns[i] = values[i] / values[i-1] - 1 (returns[0] 固定為 0，
+    區間計算一律從 1 開始)。平方和以減去整體平均後的報酬率累加，降低前綴和相減的數值誤差。
+    """
+    daily_returns = np.zeros_like(values, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_returns[1:] = values[1:] / values[:-1] - 1
+    centered = daily_returns - (daily_returns[1:].mean(axis=0) if len(values) > 1 else 0.0)
+    centered[0] = 0.0
+    negative = daily_returns < 0
+
+    def prefix_sum(x):
+        return np.concatenate((np.zeros((1,) + x.shape[1:]), np.cumsum(x, axis=0)))
+
+    return {
+        'centered': prefix_sum(centered),
+        'centered_sq': prefix_sum(centered ** 2),
+        'negative_sq': prefix_sum(np.where(negative, daily_returns ** 2, 0.0)),
+        'negative_count': prefix_sum(negative.astype(np.float64)),
+    }
+
+def _range_return_stats(prefix, start, end):
+    """由前綴和取出報酬率區間 [start, end) 的樣本變異數、負報酬平方和與負報酬次數"""
+    count = end - start
+    mean = (prefix['centered'][end] - prefix['centered'][start]) / count
+    variance = (prefix['centered_sq'][end] - prefix['centered_sq'][start] - count * mean ** 2) / (count - 1)
+    # 空手期間報酬率全為 0，前綴和相減只剩捨入誤差，視為零變異
+    rounding_error = 16 * np.finfo(np.float64).eps * prefix['centered_sq'][end] / (count - 1)
+    variance = np.where(variance <= rounding_error, 0.0, variance)
+    negative_sq = prefix['negative_sq'][end] - prefix['negative_sq'][start]
+    negative_count = prefix['negative_count'][end] - prefix['negative_count'][start]
+    return variance, negative_sq, negative_count
+
 class PerformanceAnalyzer:
     """績效分析器 (修正版)"""
     
@@ -463,8 +934,8 @@ class PerformanceAnalyzer:
         self.risk_free_rate = risk_free_rate
         self.daily_risk_free_rate = risk_free_rate / 252  # 日化無風險利率
     
-    def calculate_performance_metrics(self, equity_data, equity_column, period_name):
-        """計算績效指標 (基於市值日報酬率版本)"""
+    def calculate_performance_metrics(self, equity_data, equity_column, period_name, verbose=True):
+        """計算績效指標 (基於市值日報酬率版本)，verbose=False 時不列印計算過程與結果"""
         if len(equity_data) == 0:
             return {}
             
@@ -529,18 +1000,19 @@ class PerformanceAnalyzer:
             return_to_mdd_ratio = 0
         
         # 調試信息
-        print(f"\n🔍 {period_name} 詳細計算 (市值日報酬率版本):")
-        print(f"  期初市值: {initial_value:.4f}")
-        print(f"  期末市值: {final_value:.4f}")
-        print(f"  實際日數: {actual_days}")
-        print(f"  交易日數: {trading_days}")
-        print(f"  年數(交易日): {years:.3f}")
-        print(f"  無風險利率: {self.risk_free_rate*100:.1f}%")
-        print(f"  總報酬率: {total_return:.2f}%")
-        if years > 0:
-            print(f"  年化報酬率: {annualized_return_pct:.2f}%")
-        else:
-            print(f"  年化報酬率: 無法計算 (時間過短)")
+        if verbose:
+            print(f"\n🔍 {period_name} 詳細計算 (市值日報酬率版本):")
+            print(f"  期初市值: {initial_value:.4f}")
+            print(f"  期末市值: {final_value:.4f}")
+            print(f"  實際日數: {actual_days}")
+            print(f"  交易日數: {trading_days}")
+            print(f"  年數(交易日): {years:.3f}")
+            print(f"  無風險利率: {self.risk_free_rate*100:.1f}%")
+            print(f"  總報酬率: {total_return:.2f}%")
+            if years > 0:
+                print(f"  年化報酬率: {annualized_return_pct:.2f}%")
+            else:
+                print(f"  年化報酬率: 無法計算 (時間過短)")
         
         metrics = {
             'period': period_name,
@@ -561,22 +1033,350 @@ class PerformanceAnalyzer:
         }
         
         # 打印結果
-        print(f"\n{period_name} 績效 (市值日報酬率版本):")
-        print(f"  期初市值: {initial_value:.4f}")
-        print(f"  期末市值: {final_value:.4f}")
-        print(f"  總報酬率: {total_return:.2f}%")
-        print(f"  年化報酬率: {annualized_return_pct:.2f}%")
-        print(f"  年化波動率: {metrics['volatility']:.2f}%")
-        print(f"  夏普比率: {sharpe_ratio:.2f}")
-        print(f"  索提諾比率: {sortino_ratio:.2f}")
-        print(f"  最大回撤: {max_drawdown:.2f}%")
-        print(f"  卡瑪比率: {calmar_ratio:.2f}")
-        print(f"  風報比(波動): {return_to_volatility_ratio:.2f}")
-        print(f"  風報比(回撤): {return_to_mdd_ratio:.2f}")
-        print(f"  💡 投入100萬元的績效: {(final_value - 1) * 1000000:,.0f} TWD")
+        if verbose:
+            self.print_metrics(metrics)
         
         return metrics
 
+    def calculate_batch_metrics(self, equity_curves, index=None):
+        """批次計算多條曲線的績效指標 (逐欄向量化，不列印)
+
+        指標定義與 calculate_performance_metrics 相同，適合一次排序大量參數掃描結果。
+
+        Args:
+            equity_curves: (交易日 × 曲線) 的 2-D 陣列或寬表 DataFrame，曲線從1開始
+            index: 2-D 陣列對應的日期索引 (用於計算實際日數)；DataFrame 時預設使用其索引
+
+        Returns:
+            DataFrame: 每條曲線一列，欄位同 calculate_performance_metrics (不含 period)
+        """
+        if isinstance(equity_curves, pd.DataFrame):
+            columns = equity_curves.columns
+            index = equity_curves.index if index is None else index
+            values = equity_curves.to_numpy(dtype=np.float64)
+        else:
+            values = np.asarray(equity_curves, dtype=np.float64)
+            if values.ndim == 1:
+                values = values[:, None]
+            columns = pd.RangeIndex(values.shape[1])
+
+        trading_days, n_curves = values.shape
+        initial_value = 1.0  # 基準從1開始
+        final_value = values[-1]
+        total_return = (final_value - initial_value) / initial_value * 100
+        years = trading_days / 252  # 使用交易日計算年數
+        actual_days = (index[-1] - index[0]).days if index is not None and trading_days > 0 else np.nan
+
+        metrics = pd.DataFrame({
+            'initial_value': initial_value,
+            'final_value': final_value,
+            'total_return': total_return,
+            'annualized_return': 0.0,
+            'volatility': 0.0,
+            'sharpe_ratio': 0.0,
+            'sortino_ratio': 0.0,
+            'max_drawdown': 0.0,
+            'calmar_ratio': 0.0,
+            'return_to_volatility_ratio': 0.0,
+            'return_to_mdd_ratio': 0.0,
+            'actual_days': actual_days,
+            'trading_days': trading_days,
+            'risk_free_rate': self.risk_free_rate
+        }, index=columns)
+
+        if trading_days - 1 <= 1:
+            return metrics
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily_returns = values[1:] / values[:-1] - 1
+
+            # 年化報酬率與波動率
+            annualized_return = (final_value / initial_value) ** (1 / years) - 1
+            volatility = daily_returns.std(axis=0, ddof=1)
+            annualized_volatility = volatility * np.sqrt(252) * 100
+
+            # 夏普比率
+            sharpe_ratio = np.where(volatility != 0,
+                                    (annualized_return - self.risk_free_rate) / (annualized_volatility / 100), 0.0)
+
+            # 索提諾比率 (下檔差 = 負報酬平方均值開根號)
+            negative = daily_returns < 0
+            n_negative = negative.sum(axis=0)
+            downside_deviation = np.sqrt(np.where(negative, daily_returns ** 2, 0.0).sum(axis=0) / n_negative) * np.sqrt(252)
+            sortino_with_downside = np.where(downside_deviation != 0,
+                                             (annualized_return - self.risk_free_rate) / downside_deviation, 0.0)
+            sortino_without_downside = np.where(annualized_return > self.risk_free_rate, np.inf, 0.0)
+            sortino_ratio = np.where(n_negative > 0, sortino_with_downside, sortino_without_downside)
+
+            # 最大回撤
+            rolling_max = np.maximum.accumulate(values, axis=0)
+            max_drawdown = ((values - rolling_max) / rolling_max).min(axis=0) * 100
+
+            # 卡瑪比率與風報比
+            calmar_ratio = np.where(max_drawdown != 0,
+                                    (annualized_return - self.risk_free_rate) / np.abs(max_drawdown / 100), 0.0)
+            return_to_volatility_ratio = np.where(annualized_volatility != 0,
+                                                  annualized_return / (annualized_volatility / 100), 0.0)
+            return_to_mdd_ratio = np.where(max_drawdown != 0, annualized_return / np.abs(max_drawdown / 100), 0.0)
+
+        metrics['annualized_return'] = annualized_return * 100
+        metrics['volatility'] = annualized_volatility
+        metrics['sharpe_ratio'] = sharpe_ratio
+        metrics['sortino_ratio'] = sortino_ratio
+        metrics['max_drawdown'] = max_drawdown
+        metrics['calmar_ratio'] = calmar_ratio
+        metrics['return_to_volatility_ratio'] = return_to_volatility_ratio
+        metrics['return_to_mdd_ratio'] = return_to_mdd_ratio
+
+        return metrics
+
+    def print_metrics(self, metrics):
+        """列印單一期間的績效指標 (calculate_performance_metrics / calculate_period_metrics 的結果列)"""
+        print(f"\n{metrics['period']} 績效 (市值日報酬率版本):")
+        print(f"  期初市值: {metrics['initial_value']:.4f}")
+        print(f"  期末市值: {metrics['final_value']:.4f}")
+        print(f"  總報酬率: {metrics['total_return']:.2f}%")
+        print(f"  年化報酬率: {metrics['annualized_return']:.2f}%")
+        print(f"  年化波動率: {metrics['volatility']:.2f}%")
+        print(f"  夏普比率: {metrics['sharpe_ratio']:.2f}")
+        print(f"  索提諾比率: {metrics['sortino_ratio']:.2f}")
+        print(f"  最大回撤: {metrics['max_drawdown']:.2f}%")
+        print(f"  卡瑪比率: {metrics['calmar_ratio']:.2f}")
+        print(f"  風報比(波動): {metrics['return_to_volatility_ratio']:.2f}")
+        print(f"  風報比(回撤): {metrics['return_to_mdd_ratio']:.2f}")
+        print(f"  💡 投入100萬元的績效: {(metrics['final_value'] - 1) * 1000000:,.0f} TWD")
+
+    def calculate_period_metrics(self, equity_curves, periods='Y', rebase=False):
+        """一次計算多條曲線在多個期間的績效指標
+
+        日報酬率前綴和只建立一次，各期間以陣列視圖 (view) 取區間和與回撤高點，不為每個期間產生篩選後的 DataFrame。
+
+        Args:
+            equity_curves: 曲線 Series 或寬表 DataFrame (每欄一條曲線，如多個策略的 market_value)
+            periods: 'Y' / 'Q' / 'M' 依日曆切分，或自訂期間列表 [(名稱, 起日, 迄日), ...]，
+                     起日含、迄日不含，None 表示不設限 (時區自動對齊曲線索引)
+            rebase: False 時與 calculate_performance_metrics 相同，期初市值固定為1；
+                    True 時以期間前一交易日的市值為期初 (首個期間仍為1)，適合逐年/逐季比較
+
+        Returns:
+            DataFrame: (period, curve) 為索引，欄位同 calculate_performance_metrics
+        """
+        if isinstance(equity_curves, pd.Series):
+            equity_curves = equity_curves.to_frame(equity_curves.name or 'market_value')
+        index = equity_curves.index
+        values = equity_curves.to_numpy(dtype=np.float64)
+        prefix = _return_prefix_sums(values)
+
+        # 期間 → 位置區間 [begin, end)
+        if isinstance(periods, str):
+            naive_index = index.tz_localize(None) if index.tz is not None else index
+            labels = naive_index.to_period(periods)
+            breaks = np.concatenate(([0], np.flatnonzero(labels[1:] != labels[:-1]) + 1, [len(index)]))
+            bounds = [(str(labels[begin]), begin, end) for begin, end in zip(breaks[:-1], breaks[1:])]
+        else:
+            bounds = []
+            for name, start, end in periods:
+                begin = 0 if start is None else index.searchsorted(_split_timestamp(start, index))
+                stop = len(index) if end is None else index.searchsorted(_split_timestamp(end, index))
+                bounds.append((name, begin, stop))
+
+        n_curves = values.shape[1]
+        period_names, columns = [], {}
+        for name, begin, end in bounds:
+            trading_days = end - begin
+            if trading_days <= 0:
+                continue
+
+            # 報酬率區間：不含期間首日報酬 (與切片後 pct_change 相同)；rebase 時由前一交易日起算
+            first = begin - 1 if rebase and begin > 0 else begin
+            initial_value = values[first] if rebase and begin > 0 else np.ones(n_curves)
+            final_value = values[end - 1]
+            total_return = (final_value - initial_value) / initial_value * 100
+            years = trading_days / 252
+
+            metrics = {
+                'initial_value': initial_value,
+                'final_value': final_value,
+                'total_return': total_return,
+                'annualized_return': np.zeros(n_curves),
+                'volatility': np.zeros(n_curves),
+                'sharpe_ratio': np.zeros(n_curves),
+                'sortino_ratio': np.zeros(n_curves),
+                'max_drawdown': np.zeros(n_curves),
+                'calmar_ratio': np.zeros(n_curves),
+                'return_to_volatility_ratio': np.zeros(n_curves),
+                'return_to_mdd_ratio': np.zeros(n_curves),
+                'actual_days': np.full(n_curves, (index[end - 1] - index[begin]).days),
+                'trading_days': np.full(n_curves, trading_days),
+                'risk_free_rate': np.full(n_curves, self.risk_free_rate)
+            }
+
+            if end - (first + 1) > 1:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    variance, negative_sq, n_negative = _range_return_stats(prefix, first + 1, end)
+                    annualized_return = (final_value / initial_value) ** (1 / years) - 1
+                    annualized_volatility = np.sqrt(variance) * np.sqrt(252) * 100
+
+                    sharpe_ratio = np.where(annualized_volatility != 0,
+                                            (annualized_return - self.risk_free_rate) / (annualized_volatility / 100), 0.0)
+
+                    downside_deviation = np.sqrt(negative_sq / n_negative) * np.sqrt(252)
+                    sortino_ratio = np.where(
+                        n_negative > 0,
+                        np.where(downside_deviation != 0, (annualized_return - self.risk_free_rate) / downside_deviation, 0.0),
+                        np.where(annualized_return > self.risk_free_rate, np.inf, 0.0)
+                    )
+
+                    # 回撤高點只在期間視圖內累積
+                    window = values[first:end]
+                    rolling_max = np.maximum.accumulate(window, axis=0)
+                    max_drawdown = ((window - rolling_max) / rolling_max).min(axis=0) * 100
+
+                    metrics['annualized_return'] = annualized_return * 100
+                    metrics['volatility'] = annualized_volatility
+                    metrics['sharpe_ratio'] = sharpe_ratio
+                    metrics['sortino_ratio'] = sortino_ratio
+                    metrics['max_drawdown'] = max_drawdown
+                    metrics['calmar_ratio'] = np.where(
+                        max_drawdown != 0, (annualized_return - self.risk_free_rate) / np.abs(max_drawdown / 100), 0.0)
+                    metrics['return_to_volatility_ratio'] = np.where(
+                        annualized_volatility != 0, annualized_return / (annualized_volatility / 100), 0.0)
+                    metrics['return_to_mdd_ratio'] = np.where(
+                        max_drawdown != 0, annualized_return / np.abs(max_drawdown / 100), 0.0)
+
+            period_names.append(name)
+            for key, value in metrics.items():
+                columns.setdefault(key, []).append(value)
+
+        if not period_names:
+            return pd.DataFrame()
+
+        result_index = pd.MultiIndex.from_product([period_names, equity_curves.columns], names=['period', 'curve'])
+        return pd.DataFrame({key: np.concatenate(value) for key, value in columns.items()}, index=result_index)
+
+def _rolling_extreme(values, window, find_max=True):
+    """單調佇列 (monotonic deque) 計算滾動最大/最小值，O(n)"""
+    result = np.empty(len(values))
+    candidates = deque()  # 保存索引，對應數值單調遞減 (max) 或遞增 (min)
+    for i, value in enumerate(values):
+        while candidates and (values[candidates[-1]] <= value if find_max else values[candidates[-1]] >= value):
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        result[i] = values[candidates[0]]
+    return result
+
+def _rolling_max_drawdown(values, window):
+    """每個完整視窗 [t-w, t] (w+1 筆，同報酬率指標) 內的最大回撤，回傳長度 n-w，O(n)
+
+    區段以 (高點, 低點, 區段內最大回撤) 表示，前後兩段相接的最大回撤
+    = min(前段回撤, 後段回撤, 後段低點 / 前段高點 - 1)，滿足結合律；
+    以雙堆疊佇列做滑動視窗聚合，每筆資料只進出堆疊各一次。
+    """
+    size = window + 1
+    n = len(values)
+    if n < size:
+        return np.empty(0)
+
+    result = np.empty(n - size + 1)
+    front = []  # 佇列前段：(高點, 低點, 回撤) 為該筆至前段末端的聚合，堆疊頂為最舊的一筆
+    back = []  # 佇列後段的原始數值
+    back_high, back_low, back_drawdown = -np.inf, np.inf, 0.0
+    for i, value in enumerate(values):
+        # 新資料接在後段末端
+        back_drawdown = min(back_drawdown, value / back_high - 1) if back else 0.0
+        back_high, back_low = max(back_high, value), min(back_low, value)
+        back.append(value)
+
+        if i >= size:
+            # 移除視窗最舊的一筆；前段用完時將後段由新到舊轉成前段聚合
+            if not front:
+                high, low, drawdown = -np.inf, np.inf, 0.0
+                for old in reversed(back):
+                    drawdown = min(drawdown, low / old - 1)
+                    high, low = max(high, old), min(low, old)
+                    front.append((high, low, drawdown))
+                back = []
+                back_high, back_low, back_drawdown = -np.inf, np.inf, 0.0
+            front.pop()
+
+        if i >= size - 1:
+            if not front:
+                result[i - size + 1] = back_drawdown
+            elif not back:
+                result[i - size + 1] = front[-1][2]
+            else:
+                high, _, drawdown = front[-1]
+                result[i - size + 1] = min(drawdown, back_drawdown, back_low / high - 1)
+    return result
+
+class RollingPerformanceAnalyzer(PerformanceAnalyzer):
+    """滾動視窗績效分析器 - 以前綴和、單調佇列與雙堆疊佇列在 O(n) 內計算滾動指標
+
+    不對每個視窗重新計算，而是一次建立日報酬率的前綴和 (一次方、平方、負報酬平方、負報酬次數)，
+    每個視窗的波動率、夏普比率與索提諾比率都以 O(1) 取得；回撤以單調佇列維護視窗高點，
+    視窗內最大回撤以雙堆疊佇列滑動聚合 (高點與低點皆在視窗內)。
+    """
+
+    def calculate_rolling_metrics(self, equity_data, equity_column, windows=(63, 126, 252)):
+        """計算滾動績效指標
+
+        Args:
+            equity_data: 含曲線欄位的 DataFrame
+            equity_column: 曲線欄位名稱 (如 'market_value')
+            windows: 視窗長度 (交易日)
+
+        Returns:
+            DataFrame: 每個視窗 w 產生下列欄位 (數值定義同 PerformanceAnalyzer，百分比欄位以 % 表示)
+                annualized_return_w: 視窗內年化報酬率 (期末 / 期初)
+                volatility_w: 年化波動率
+                sharpe_ratio_w / sortino_ratio_w
+                drawdown_w: 相對視窗內高點的回撤
+                max_drawdown_w: 視窗內的最大回撤 (高點與低點皆在視窗內)
+            各欄位的視窗皆為 [t-w, t] 共 w+1 筆數值 (w 個日報酬率)；
+            前 w 日資料不足，各欄位為 NaN
+        """
+        values = equity_data[equity_column].to_numpy(dtype=np.float64)
+        n = len(values)
+
+        prefix = _return_prefix_sums(values)
+
+        rolling = pd.DataFrame(index=equity_data.index)
+        for window in windows:
+            # 視窗 [t-w+1, t] 共 w 個日報酬率 (需要 t >= w)
+            end = np.arange(window, n)
+            start = end - window + 1
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                variance, negative_sq, n_negative = _range_return_stats(prefix, start, end + 1)
+                volatility = np.sqrt(variance) * np.sqrt(252)
+                annualized_return = (values[end] / values[end - window]) ** (252 / window) - 1
+
+                sharpe_ratio = np.where(volatility != 0, (annualized_return - self.risk_free_rate) / volatility, 0.0)
+
+                downside_deviation = np.sqrt(negative_sq / n_negative) * np.sqrt(252)
+                sortino_ratio = np.where(
+                    n_negative > 0,
+                    np.where(downside_deviation != 0, (annualized_return - self.risk_free_rate) / downside_deviation, 0.0),
+                    np.where(annualized_return > self.risk_free_rate, np.inf, 0.0)
+                )
+
+            drawdown = (values / _rolling_extreme(values, window + 1, find_max=True) - 1)[window:]
+            max_drawdown = _rolling_max_drawdown(values, window)
+
+            def padded(x):
+                return np.concatenate((np.full(n - len(x), np.nan), x))
+
+            rolling[f'annualized_return_{window}'] = padded(annualized_return * 100)
+            rolling[f'volatility_{window}'] = padded(volatility * 100)
+            rolling[f'sharpe_ratio_{window}'] = padded(sharpe_ratio)
+            rolling[f'sortino_ratio_{window}'] = padded(sortino_ratio)
+            rolling[f'drawdown_{window}'] = padded(drawdown * 100)
+            rolling[f'max_drawdown_{window}'] = padded(max_drawdown * 100)
+
+        return rolling
+
 def create_comparison_charts(results, taiex_results, config):
     """創建比較圖表 - 市值曲線 vs 權益曲線"""
     print("\n=== 生成比較圖表 (市值曲線 vs 權益曲線) ===")
@@ -735,6 +1535,214 @@ def create_comparison_charts(results, taiex_results, config):
     print(f"圖表已保存：策略績效比較_市值vs權益曲線_{POSITION_SIZE}口標準化.png")
     plt.show()
 
+# ==================== 參數掃描 ====================
+# 子行程共用的回測數據 (由 _init_sweep_worker 設定，每個子行程只傳送一次)
+_SWEEP_DATA = None
+_SWEEP_SPLIT_DATE = None
+
+def _split_timestamp(split_date, index):
+    """將分割日期轉為與數據索引相同時區的 Timestamp"""
+    split_ts = pd.Timestamp(split_date)
+    if index.tz is not None:
+        return split_ts.tz_localize(index.tz) if split_ts.tz is None else split_ts.tz_convert(index.tz)
+    return split_ts.tz_localize(None) if split_ts.tz is not None else split_ts
+
+def _init_sweep_worker(data, split_date):
+    """參數掃描子行程初始化"""
+    global _SWEEP_DATA, _SWEEP_SPLIT_DATE
+    _SWEEP_DATA = data
+    _SWEEP_SPLIT_DATE = _split_timestamp(split_date, data.index)
+
+def _run_sweep_task(params):
+    """執行單一參數組合的回測，回傳樣本內外績效 (每期一列)"""
+    position_size, signal_threshold, exit_signal_threshold = params
+    config = PureStrategyConfig(position_size=position_size,
+                                signal_threshold=signal_threshold,
+                                exit_signal_threshold=exit_signal_threshold)
+    results = PureRetailSentimentStrategy(config).run_backtest(_SWEEP_DATA, vectorized=True, verbose=False)
+
+    analyzer = PerformanceAnalyzer()
+    periods = [
+        ('in_sample', results[results.index < _SWEEP_SPLIT_DATE]),
+        ('out_of_sample', results[results.index >= _SWEEP_SPLIT_DATE])
+    ]
+    rows = []
+    for period_name, period_data in periods:
+        metrics = analyzer.calculate_performance_metrics(period_data, 'market_value', period_name, verbose=False)
+        if metrics:
+            rows.append({
+                'signal_threshold': signal_threshold,
+                'exit_signal_threshold': exit_signal_threshold,
+                'position_size': position_size,
+                **metrics
+            })
+    return rows
+
+def run_parameter_sweep(signal_thresholds, exit_signal_thresholds, position_sizes=(POSITION_SIZE,),
+                        data=None, split_date=SPLIT_DATE, max_workers=None, chunksize=None):
+    """平行參數掃描
+
+    數據只載入一次 (load_real_data)，並在每個子行程初始化時傳送一次，
+    再以行程池平行執行各參數組合的向量化回測。
+
+    Args:
+        signal_thresholds: 進場閾值列表 (SIGNAL_THRESHOLD)
+        exit_signal_thresholds: 出場閾值列表 (EXIT_SIGNAL_THRESHOLD)
+        position_sizes: 持倉口數列表 (POSITION_SIZE)
+        data: 已載入的合併數據，None 時呼叫 load_real_data()
+        split_date: 樣本內外分割日
+        max_workers: 子行程數量，None 為 CPU 核心數
+        chunksize: 每次派送給子行程的參數組合數，None 時自動決定
+
+    Returns:
+        DataFrame: 每個參數組合 × 期間 (in_sample / out_of_sample) 一列的績效指標
+    """
+    if data is None:
+        data = load_real_data()
+
+    grid = list(itertools.product(position_sizes, signal_thresholds, exit_signal_thresholds))
+    n_workers = max_workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(grid) // (n_workers * 4))
+
+    print(f"\n=== 參數掃描：{len(grid)} 組參數，{n_workers} 個子行程 ===")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_sweep_worker,
+                             initargs=(data, split_date)) as executor:
+        for task_rows in executor.map(_run_sweep_task, grid, chunksize=chunksize):
+            rows.extend(task_rows)
+
+    sweep_df = pd.DataFrame(rows)
+    print(f"參數掃描完成：共 {len(sweep_df)} 筆績效結果")
+    return sweep_df
+
+# ==================== 滾動前進最佳化 (Walk-Forward) ====================
+# 子行程共用的完整數據，各視窗以位置切片取用 (不複製)
+_WALK_FORWARD_DATA = None
+
+def _init_walk_forward_worker(data):
+    """滾動前進子行程初始化"""
+    global _WALK_FORWARD_DATA
+    _WALK_FORWARD_DATA = data
+
+def _build_walk_forward_windows(index, train_years, test_years, anchored):
+    """以交易日索引建立 (訓練起點, 測試起點, 測試終點) 的位置切片"""
+    windows = []
+    test_start = index[0] + pd.DateOffset(years=train_years)
+    while test_start <= index[-1]:
+        test_end = test_start + pd.DateOffset(years=test_years)
+        train_start = index[0] if anchored else test_start - pd.DateOffset(years=train_years)
+        windows.append((
+            int(index.searchsorted(train_start)),
+            int(index.searchsorted(test_start)),
+            int(index.searchsorted(test_end))
+        ))
+        test_start = test_end
+    return windows
+
+def _run_walk_forward_window(task):
+    """單一視窗：於訓練期以批次回測選出最佳閾值，再套用至測試期"""
+    window_id, (train_start, test_start, test_end), signal_grid, exit_grid, position_size = task
+    train_data = _WALK_FORWARD_DATA.iloc[train_start:test_start]
+    test_data = _WALK_FORWARD_DATA.iloc[test_start:test_end]
+
+    batch = BatchRetailSentimentStrategy(signal_grid, exit_grid, position_size)
+    train_results = batch.run_backtest(train_data, verbose=False)
+    train_metrics = PerformanceAnalyzer().calculate_batch_metrics(train_results['market_value'])
+    train_sharpe = np.nan_to_num(train_metrics['sharpe_ratio'].to_numpy(), nan=-np.inf)
+    best = int(np.argmax(train_sharpe))
+
+    config = PureStrategyConfig(position_size=position_size,
+                                signal_threshold=signal_grid[best],
+                                exit_signal_threshold=exit_grid[best])
+    test_results = PureRetailSentimentStrategy(config).run_backtest(test_data, vectorized=True, verbose=False)
+
+    # 測試視窗結束時仍持倉則以最後收盤價平倉：未實現損益轉為已實現，市值與權益在視窗交界一致
+    last = test_results.index[-1]
+    if test_results.at[last, 'position'] > 0:
+        realized_value = test_results.at[last, 'market_value']
+        test_results.loc[last, ['equity_value', 'cumulative_pnl', 'position']] = [realized_value, realized_value - 1.0, 0]
+        previous_equity = test_results['equity_value'].iloc[-2] if len(test_results) > 1 else 1.0
+        test_results.loc[last, 'daily_equity_return'] = realized_value / previous_equity - 1
+
+    window_info = {
+        'window': window_id,
+        'train_start': train_data.index[0],
+        'train_end': train_data.index[-1],
+        'test_start': test_data.index[0],
+        'test_end': test_data.index[-1],
+        'signal_threshold': signal_grid[best],
+        'exit_signal_threshold': exit_grid[best],
+        'train_sharpe_ratio': train_sharpe[best],
+        'test_final_value': test_results['market_value'].iloc[-1]
+    }
+    return window_info, test_results
+
+def run_walk_forward(signal_thresholds, exit_signal_thresholds, position_size=POSITION_SIZE, data=None,
+                     train_years=3, test_years=1, anchored=False, max_workers=None):
+    """滾動前進最佳化
+
+    以訓練視窗 (rolling 或 anchored) 重新最佳化進出場閾值 (訓練期夏普比率最高者)，
+    套用於緊接的測試視窗 (視窗結束時以最後收盤價平倉)，最後將各測試視窗的樣本外曲線以單利方式接續成一條曲線。
+    各視窗於行程池中平行執行，數據只在子行程初始化時傳送一次，視窗以位置切片取用。
+
+    Args:
+        signal_thresholds: 進場閾值候選值
+        exit_signal_thresholds: 出場閾值候選值
+        position_size: 持倉口數
+        data: 已載入的合併數據，None 時呼叫 load_real_data()
+        train_years: 訓練視窗年數 (anchored=True 時為第一個訓練視窗年數)
+        test_years: 測試視窗年數
+        anchored: True 為固定起點的擴張視窗，False 為固定長度的滾動視窗
+        max_workers: 子行程數量，None 為 CPU 核心數
+
+    Returns:
+        tuple: (各視窗最佳參數與績效的 DataFrame, 接續後的樣本外曲線 DataFrame)
+    """
+    if data is None:
+        data = load_real_data()
+
+    grid = list(itertools.product(signal_thresholds, exit_signal_thresholds))
+    signal_grid = np.array([signal for signal, _ in grid], dtype=np.float64)
+    exit_grid = np.array([exit_ for _, exit_ in grid], dtype=np.float64)
+
+    windows = _build_walk_forward_windows(data.index, train_years, test_years, anchored)
+    windows = [window for window in windows if window[2] > window[1]]
+    if not windows:
+        raise ValueError("數據長度不足以建立任何滾動前進視窗")
+
+    print(f"\n=== 滾動前進最佳化：{len(windows)} 個視窗，每視窗 {len(grid)} 組參數 "
+          f"({'anchored' if anchored else 'rolling'}，訓練 {train_years} 年 / 測試 {test_years} 年) ===")
+
+    tasks = [(window_id, window, signal_grid, exit_grid, position_size)
+             for window_id, window in enumerate(windows)]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_walk_forward_worker,
+                             initargs=(data,)) as executor:
+        window_results = list(executor.map(_run_walk_forward_window, tasks))
+
+    # 以單利方式接續樣本外曲線：每個測試視窗從空手開始、結束時平倉，
+    # 視窗期末市值與權益相同，下一視窗兩條曲線以同一個已實現損益接續
+    stitched = []
+    offset = 0.0
+    for window_info, test_results in window_results:
+        curve = test_results[['market_value', 'equity_value', 'price', 'sentiment', 'position']].copy()
+        curve['market_value'] += offset
+        curve['equity_value'] += offset
+        curve['window'] = window_info['window']
+        offset = curve['equity_value'].iloc[-1] - 1.0
+        stitched.append(curve)
+
+    oos_curve = pd.concat(stitched)
+    oos_curve['daily_market_return'] = oos_curve['market_value'].pct_change().fillna(0)
+    oos_curve['daily_equity_return'] = oos_curve['equity_value'].pct_change().fillna(0)
+    windows_df = pd.DataFrame([window_info for window_info, _ in window_results])
+
+    print(windows_df[['window', 'test_start', 'test_end', 'signal_threshold', 'exit_signal_threshold']].to_string(index=False))
+    print(f"樣本外接續曲線期末市值: {oos_curve['market_value'].iloc[-1]:.4f}")
+
+    return windows_df, oos_curve
+
 def main():
     """主程式"""
     # 配置
@@ -752,18 +1760,19 @@ def main():
     
     try:
         # 1. 載入真實數據
-        if ZIPLINE_AVAILABLE:
-            data = load_real_data()
-        else:
+        if DATA_PROVIDER is None:
             print("無法載入真實數據，程式終止")
             return
+        if AUTO_INGEST and DATA_PROVIDER.name == 'tquant':
+            ensure_bundle('tquant_future')  # 標的與日期取自環境變數 future / mdate
+        data = load_real_data()
         
         # 2. 執行純策略回測
         pure_strategy = PureRetailSentimentStrategy(config)
-        results = pure_strategy.run_backtest(data)
+        results = pure_strategy.run_backtest(data, vectorized=VECTORIZED_BACKTEST)
         
         # 3. 執行台指期貨 TX Buy and Hold 策略
-        buy_hold_strategy = TXBuyAndHoldStrategy(config.initial_capital)
+        buy_hold_strategy = TXBuyAndHoldStrategy(config.initial_capital, config.position_size)
         taiex_results = buy_hold_strategy.run_backtest(data)
         
         # 4. 績效分析
@@ -772,32 +1781,25 @@ def main():
         print("="*80)
         
         analyzer = PerformanceAnalyzer()
-        split_date = pd.to_datetime(config.split_date).tz_localize('UTC')
+        periods = [
+            ("樣本內 (2010-2019)", None, config.split_date),
+            ("樣本外 (2020-2025)", config.split_date, None)
+        ]
         
         # 樣本內外分析
         print("\n📊 情緒策略績效分析 (基於市值日報酬率計算)：")
         print("="*60)
         
-        in_sample = results[results.index < split_date]
-        out_sample = results[results.index >= split_date]
-        
-        in_sample_perf = analyzer.calculate_performance_metrics(in_sample, 'market_value', "樣本內 (2010-2019)")
-        out_sample_perf = analyzer.calculate_performance_metrics(out_sample, 'market_value', "樣本外 (2020-2025)")
+        strategy_perf = analyzer.calculate_period_metrics(results['market_value'], periods)
+        for (period, _), row in strategy_perf.iterrows():
+            analyzer.print_metrics({**row.to_dict(), 'period': period})
         
         print("\n📊 TX期貨 Buy & Hold 績效分析：")
         print("="*60)
         
-        # 處理台指數據的時區問題
-        if taiex_results.index.tz is None:
-            taiex_split_date = split_date.tz_localize(None) if split_date.tz is not None else split_date
-        else:
-            taiex_split_date = split_date.tz_localize('UTC') if split_date.tz is None else split_date
-        
-        taiex_in_sample = taiex_results[taiex_results.index < taiex_split_date]
-        taiex_out_sample = taiex_results[taiex_results.index >= taiex_split_date]
-        
-        taiex_in_perf = analyzer.calculate_performance_metrics(taiex_in_sample, 'market_value', "樣本內 (2010-2019)")
-        taiex_out_perf = analyzer.calculate_performance_metrics(taiex_out_sample, 'market_value', "樣本外 (2020-2025)")
+        taiex_perf = analyzer.calculate_period_metrics(taiex_results['market_value'], periods)
+        for (period, _), row in taiex_perf.iterrows():
+            analyzer.print_metrics({**row.to_dict(), 'period': period})
         
         # 5. 生成比較圖表
         create_comparison_charts(results, taiex_results, config)
@@ -13,46 +13,70 @@
 #
 # 參考md檔說明，並補充註解與結構優化。
 import os
-import tejapi
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
+
+# 共用資料層 (strategy/ 下的快取、資料來源與 ingest 管理模組)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)) if '__file__' in globals() else os.getcwd(), 'strategy'))
+from data_cache import cached_date_range
+from data_providers import get_data_provider, tejapi_get_batch
+from bundle_ingest import ensure_bundle
+from data_align import asof_align
+from rotation_screen import rotation_signals, simulate_rotation, screen_rotations, deviation_report
 # === 1. 下載與處理資料 ===
 os.environ['TEJAPI_KEY'] = ''
 os.environ['TEJAPI_BASE'] = ''
-tejapi.ApiConfig.api_key = os.environ['TEJAPI_KEY']
-tejapi.ApiConfig.api_base = os.environ['TEJAPI_BASE']
-tejapi.ApiConfig.ignoretz = True
-
-# 下載景氣分數資料 (如SCORE)
-data = tejapi.get('GLOBAL/ANMAR', mdate={'gte':'2000-01-01', 'lte':'2025-04-09'}, coid = 'EA1101')
+try:
+  import tejapi
+  tejapi.ApiConfig.api_key = os.environ['TEJAPI_KEY']
+  tejapi.ApiConfig.api_base = os.environ['TEJAPI_BASE']
+  tejapi.ApiConfig.ignoretz = True
+except ImportError:
+  # synthetic / local 資料來源離線執行時不需要 tejapi
+  tejapi = None
+
+# 資料來源 (環境變數 TQUANT_DATA_PROVIDER，預設 tquant 即 tejapi；synthetic / local 可離線執行)
+provider = get_data_provider()
+
+# 資料期間 (增量快取：已下載的日期不重抓，只補抓尾端新資料並以 mdate 去重)
+data_start = '2000-01-01'
+data_end = '2025-04-09'
+
+# 下載景氣分數資料 (如SCORE)，月資料近期數值可能修正，回補最近兩個月
+data = cached_date_range(f'{provider.name}: GLOBAL/ANMAR EA1101',
+                         lambda start, end: provider.tejapi_get('GLOBAL/ANMAR', mdate={'gte': start, 'lte': end}, coid = 'EA1101'),
+                         data_start, data_end, overlap_days=62)
 data.sort_values('mdate')
 
-# 下載0050 ETF價格資料
-data2 = tejapi.get('TWN/AAPRCDA', coid = ['0050'], mdate={'gte':'2000-01-01', 'lte':'2025-04-09'})
+# 下載 ETF 價格資料 (0050、短債 00865B、長債 00687B、0050 反一 00664R)，
+# 多檔合併成一次分頁查詢並依 coid 分別快取，擴充資產只下載新代碼
+etf_pool = ['0050', '00865B', '00687B', '00664R']
+etf_prices = tejapi_get_batch(provider, 'TWN/AAPRCDA', etf_pool, data_start, data_end)
+data2 = etf_prices['0050']
 df_price = data2[['mdate','close_d', 'avgclsd']].copy()
-# 下載短期債券ETF價格資料
-data3 = tejapi.get('TWN/AAPRCDA', coid = ['00865B'], mdate={'gte':'2000-01-01', 'lte':'2025-04-09'})
+# 短期債券ETF價格資料
+data3 = etf_prices['00865B']
 df_bond = data3[['mdate','close_d', 'avgclsd']].copy()
 
 # 日期欄位處理與對齊
 data['mdate'] = pd.to_datetime(data['mdate'])
-data['val_shifted'] = data['val'].shift(1)  # SCORE前移一日，避免未來資料洩漏
 df_price['mdate'] = pd.to_datetime(df_price['mdate'])
 df_bond['mdate'] = pd.to_datetime(df_bond['mdate'])
 
 # 設定索引
-data = data.set_index('mdate', drop=False)
+data = data.set_index('mdate', drop=False).sort_index()
 df_price = df_price.set_index('mdate', drop=False)
 df_bond = df_bond.set_index('mdate', drop=False)
 
-# 補齊每日資料 (前向填補)
-df_P_daily = data.resample('D').ffill()
-
-# 合併所有資料 (以0050為主)
-df = df_price.join(df_P_daily, how = 'left', rsuffix='_P')
-df = df.join(df_bond, how = 'left', rsuffix='_bond')
-df['mdate'] = df['mdate'].dt.strftime('%Y-%m-%d')
-df['mdate'] = pd.to_datetime(df['mdate'])
+# 以0050交易日為主 as-of 對齊 (不展開每日資料)：景氣分數沿用最近一期，最後一期之後不延伸
+df = df_price.copy()
+df['val'] = asof_align(df.index, data['val'], extend = False)
+df['val_shifted'] = asof_align(df.index, data['val'], lag = 1, extend = False)  # SCORE前移一期，避免未來資料洩漏
+# 債券ETF只取同一交易日的資料
+df = df.join(asof_align(df.index, df_bond[['close_d', 'avgclsd']], max_staleness = pd.Timedelta(0)).add_suffix('_bond'))
 
 # %%
 
@@ -87,12 +111,18 @@ tej_key = 'your key'  # 請填入TEJ金鑰
 os.environ['TEJAPI_BASE'] = "https://api.tej.com.tw"
 os.environ['TEJAPI_KEY'] = tej_key
 
-from zipline.data.run_ingest import simple_ingest
-from zipline.api import set_slippage, set_commission, set_benchmark, symbol, record
-from zipline.api import order_target_percent, order_percent, order
-from zipline.api import set_long_only, set_max_leverage
-from zipline.finance import commission, slippage
-from zipline import run_algorithm
+# 未安裝 zipline 時 (synthetic / local 資料來源離線執行) 略過 ingest 與回測，只執行資料處理與門檻快速篩選
+try:
+  from zipline.data.run_ingest import simple_ingest
+  from zipline.api import set_slippage, set_commission, set_benchmark, symbol, record
+  from zipline.api import order_target_percent, order_percent, order
+  from zipline.api import set_long_only, set_max_leverage
+  from zipline.finance import commission, slippage
+  from zipline import run_algorithm
+  ZIPLINE_AVAILABLE = True
+except ImportError as e:
+  print(f'⚠️  zipline 無法導入 ({e})，略過 bundle ingest 與 zipline 回測')
+  ZIPLINE_AVAILABLE = False
 
 # 資產池：股票、債券、反向ETF等
 pool = ['0050', 'IR0001', '00865B', '00687B', '00664R']
@@ -101,11 +131,26 @@ end_date = '2025-04-09'
 start_ingest = start_date.replace('-', '')
 end_ingest = end_date.replace('-', '')
 
-# 下載歷史行情資料 (Zipline bundle)
-simple_ingest(name = 'tquant', tickers = pool, start_date = start_ingest, end_date = end_ingest)
+# 下載歷史行情資料 (Zipline bundle)，已涵蓋的標的與日期不重複 ingest
+if ZIPLINE_AVAILABLE:
+  ensure_bundle('tquant', tickers = pool, start_date = start_ingest, end_date = end_ingest, ticker_env = 'ticker',
+                full_ingest = lambda: simple_ingest(name = 'tquant', tickers = pool, start_date = start_ingest, end_date = end_ingest))
 
 print(pool)
 
+def build_score_lookup(score_data):
+  """預先建立 日期 -> 景氣分數 對照表，handle_data 每日以 O(1) 查詢
+
+  結果與原本逐日掃描 score_data[score_data['mdate'].shift(1) == 日期]['val_shifted'].iloc[-1] 相同：
+  取 mdate 等於該日那一列的「下一列」val_shifted (同一日期有多筆時取最後一筆)。
+  """
+  dates = pd.to_datetime(score_data['mdate']).dt.date.to_numpy()
+  scores = score_data['val_shifted'].to_numpy()
+  return dict(zip(dates[:-1], scores[1:]))
+
+# 回測前只建立一次
+score_by_date = build_score_lookup(df)
+
 def initialize(context, pool = pool):
 
   set_slippage(slippage.TW_Slippage(spread = 0.3 , volume_limit = 1))
@@ -128,236 +173,107 @@ def initialize(context, pool = pool):
   context.stock = symbol('0050')
 
 
-# short trem debt
-def handle_data(context, data, score_data = df):
-
-  backtest_date = data.current_dt.date()
-  today_data = score_data[score_data['mdate'].shift(1) == pd.to_datetime(backtest_date)]
-  context.score = today_data['val_shifted'].iloc[-1]
-
-  record(score=context.score)
-
-  if context.score <= 16 and context.state == False:
-    order_target_percent(context.stock, 1.0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-    context.buy_date.append(pd.to_datetime(backtest_date))
-    context.state = True
-
-    if context.hedge_state == True:
-      order_target_percent(context.bond, 0)
-      print(f"Date: {backtest_date}, Score: {context.score}，賣出債券")
-      context.hedge_state = False
-
-
-  if context.score >= 38 and context.state == True:
-    order_target_percent(context.stock, 0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 賣出 0050")
-    context.sell_date.append(pd.to_datetime(backtest_date))
-    context.state = False
-
-    if context.hedge_state == False :
-      order_target_percent(context.bond, 1.0)
-      print(f"Date: {backtest_date}, Score: {context.score}，買入債券避險")
-      context.hedge_state = True
+class RotationEngine:
+  """景氣循環輪動引擎：以設定取代各避險資產版本的 handle_data
+
+  訊號 (持股狀態、避險狀態) 在回測開始前以交易日序列一次算好，
+  handle_data 每日只需依排程下單；同一套邏輯也能離線對不同門檻做掃描。
+
+  規則 (與原本各版本 handle_data 相同)：
+    - 分數 <= low 且未持股：買進股票至 stock_weight，若持有避險資產則賣出
+    - 分數 >= high 且持股：股票降至 exit_stock_weight，若避險已啟用且未持有則買入 hedge_weight
+    - 第一次出現 low < 分數 < high (進入景氣循環) 且未持股：買進股票 (不處理避險)
+    - 避險資產在 hedge_start 當日收盤後才啟用 (例如 00865B 自 2019-11-25 起交易)
+
+  Args:
+    stock: 股票標的代碼
+    hedge: 避險標的代碼，None 表示出場時持有現金
+    low, high: 景氣分數進出場門檻
+    stock_weight: 進場時股票目標權重
+    exit_stock_weight: 出場時股票目標權重 (50:50 版本為 0.5)
+    hedge_weight: 出場時避險資產目標權重
+    hedge_start: 避險資產開始交易日
+    score_lookup: 日期 -> 景氣分數 對照表
+  """
+
+  def __init__(self, stock = '0050', hedge = None, low = 16, high = 38,
+               stock_weight = 1.0, exit_stock_weight = 0.0, hedge_weight = 1.0,
+               hedge_start = '2019-11-25', score_lookup = score_by_date):
+    self.stock = stock
+    self.hedge = hedge
+    self.low = low
+    self.high = high
+    self.stock_weight = stock_weight
+    self.exit_stock_weight = exit_stock_weight
+    self.hedge_weight = hedge_weight
+    self.hedge_start = pd.Timestamp(hedge_start)
+    self.score_lookup = score_lookup
+
+  def signals(self, dates):
+    """計算交易日序列上的進出場訊號 (見 rotation_screen.rotation_signals)
+
+    Args:
+      dates: 交易日序列 (可為 Timestamp 或 date)
+
+    Returns:
+      DataFrame: index 為交易日，欄位 score、holding (是否持股)、
+                 stock_target / hedge_target (當日下單的目標權重，NaN 表示不下單)
+    """
+    dates = pd.DatetimeIndex([pd.Timestamp(d).date() for d in dates])
+    score = pd.Series([self.score_lookup[d.date()] for d in dates], index = dates, dtype = float)
+    return rotation_signals(score, self.low, self.high, self.stock_weight, self.exit_stock_weight,
+                            self.hedge_weight if self.hedge is not None else None, self.hedge_start)
+
+  def _prepare(self, context):
+    """第一根 bar 依本次回測的交易日建立下單排程"""
+    signals = self.signals(context.sim_params.sessions)
+    stock = symbol(self.stock)
+    hedge = symbol(self.hedge) if self.hedge is not None else None
+
+    context.rotation_orders = {}
+    for date, row in signals[signals[['stock_target', 'hedge_target']].notna().any(axis = 1)].iterrows():
+      orders = []
+      if not np.isnan(row['stock_target']):
+        orders.append((stock, row['stock_target'], f"{'買進' if row['holding'] else '賣出'} {self.stock}"))
+      if not np.isnan(row['hedge_target']):
+        orders.append((hedge, row['hedge_target'], f"{'買入' if row['hedge_target'] > 0 else '賣出'} {self.hedge}"))
+      context.rotation_orders[date.date()] = orders
+
+    context.buy_date = list(signals.index[signals['holding'] & signals['stock_target'].notna()])
+    context.sell_date = list(signals.index[~signals['holding'] & signals['stock_target'].notna()])
+
+  def handle_data(self, context, data):
+    if context.i == 0:
+      self._prepare(context)
+    context.i += 1
+
+    backtest_date = data.current_dt.date()
+    context.score = self.score_lookup[backtest_date]
+    record(score=context.score)
+
+    for asset, target, action in context.rotation_orders.get(backtest_date, ()):
+      order_target_percent(asset, target)
+      print(f"Date: {backtest_date}, Score: {context.score}, {action}")
 
 
-
-  if context.score > 16 and context.score < 38 and context.a == 0:
-    context.a = 1
-    print('進入景氣循環')
-    if context.state == False:
-      order_target_percent(context.stock, 1.0)
-      print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-      context.buy_date.append(pd.to_datetime(backtest_date))
-      context.state = True
-
-  # 因為 00685B 從 2019-11-25 才開始被交易
-  if pd.to_datetime(backtest_date) >= pd.to_datetime('2019-11-25') and context.b == 0:
-    context.b = 1
-    context.hedge_state = False
-
+# short trem debt
+handle_data = RotationEngine(hedge = '00865B').handle_data
 # Cash
-def handle_data_2(context, data, score_data = df):
-  backtest_date = data.current_dt.date()
-  today_data = score_data[score_data['mdate'].shift(1) == pd.to_datetime(backtest_date)]
-  context.score = today_data['val_shifted'].iloc[-1]
-
-  record(score=context.score)
-  
-
-  if context.score <= 16 and context.state == False:
-    order_target_percent(context.stock, 1.0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-    context.buy_date.append(pd.to_datetime(backtest_date))
-    context.state = True
-
-  if context.score >= 38 and context.state == True:
-    order_target_percent(context.stock, 0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 賣出 0050")
-    context.sell_date.append(pd.to_datetime(backtest_date))
-    context.state = False
-
-  if context.score > 16 and context.score < 38 and context.a == 0:
-    context.a = 1
-    print('進入景氣循環')
-    if context.state == False:
-      order_target_percent(context.stock, 1.0)
-      print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-      context.buy_date.append(pd.to_datetime(backtest_date))
-      context.state = True
-
+handle_data_2 = RotationEngine(hedge = None).handle_data
 # long term debt
-def handle_data_3(context, data, score_data = df):
-  context.bond = symbol('00687B')
-  backtest_date = data.current_dt.date()
-  today_data = score_data[score_data['mdate'].shift(1) == pd.to_datetime(backtest_date)]
-  context.score = today_data['val_shifted'].iloc[-1]
-
-  record(score=context.score)
-
-  if context.score <= 16 and context.state == False:
-    order_target_percent(context.stock, 1.0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-    context.buy_date.append(pd.to_datetime(backtest_date))
-    context.state = True
-
-    if context.hedge_state == True:
-      order_target_percent(context.bond, 0)
-      print(f"Date: {backtest_date}, Score: {context.score}，賣出債券")
-      context.hedge_state = False
-
-
-  if context.score >= 38 and context.state == True:
-    order_target_percent(context.stock, 0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 賣出 0050")
-    context.sell_date.append(pd.to_datetime(backtest_date))
-    context.state = False
-
-    if context.hedge_state == False :
-      order_target_percent(context.bond, 1.0)
-      print(f"Date: {backtest_date}, Score: {context.score}，買入債券避險")
-      context.hedge_state = True
-
-
-
-  if context.score > 16 and context.score < 38 and context.a == 0:
-    context.a = 1
-    print('進入景氣循環')
-    if context.state == False:
-      order_target_percent(context.stock, 1.0)
-      print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-      context.buy_date.append(pd.to_datetime(backtest_date))
-      context.state = True
-
-  # 因為 00685B 從 2019-11-25 才開始被交易
-  if pd.to_datetime(backtest_date) >= pd.to_datetime('2019-11-25') and context.b == 0:
-    context.b = 1
-    context.hedge_state = False
-
+handle_data_3 = RotationEngine(hedge = '00687B').handle_data
 # 0050 反一
-def handle_data_4(context, data, score_data = df):
-  context.bond = symbol('00664R')
-  backtest_date = data.current_dt.date()
-  today_data = score_data[score_data['mdate'].shift(1) == pd.to_datetime(backtest_date)]
-  context.score = today_data['val_shifted'].iloc[-1]
-
-  record(score=context.score)
-
-  if context.score <= 16 and context.state == False:
-    order_target_percent(context.stock, 1.0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-    context.buy_date.append(pd.to_datetime(backtest_date))
-    context.state = True
-
-    if context.hedge_state == True:
-      order_target_percent(context.bond, 0)
-      print(f"Date: {backtest_date}, Score: {context.score}，賣出 0050 反一")
-      context.hedge_state = False
-
-
-  if context.score >= 38 and context.state == True:
-    order_target_percent(context.stock, 0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 賣出 0050")
-    context.sell_date.append(pd.to_datetime(backtest_date))
-    context.state = False
-
-    if context.hedge_state == False :
-      order_target_percent(context.bond, 1.0)
-      print(f"Date: {backtest_date}, Score: {context.score}，買入 0050反一")
-      context.hedge_state = True
-
-
-
-  if context.score > 16 and context.score < 38 and context.a == 0:
-    context.a = 1
-    print('進入景氣循環')
-    if context.state == False:
-      order_target_percent(context.stock, 1.0)
-      print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-      context.buy_date.append(pd.to_datetime(backtest_date))
-      context.state = True
-
-  # 因為 00685B 從 2019-11-25 才開始被交易
-  if pd.to_datetime(backtest_date) >= pd.to_datetime('2019-11-25') and context.b == 0:
-    context.b = 1
-    context.hedge_state = False
-
+handle_data_4 = RotationEngine(hedge = '00664R').handle_data
 # 50:50 (0050 短債)
-def handle_data_5(context, data, score_data = df):
-
-  backtest_date = data.current_dt.date()
-  today_data = score_data[score_data['mdate'].shift(1) == pd.to_datetime(backtest_date)]
-  context.score = today_data['val_shifted'].iloc[-1]
-
-  record(score=context.score)
-
-  if context.score <= 16 and context.state == False:
-    order_target_percent(context.stock, 1.0)
-    print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-    context.buy_date.append(pd.to_datetime(backtest_date))
-    context.state = True
-
-    if context.hedge_state == True:
-      order_target_percent(context.bond, 0)
-      print(f"Date: {backtest_date}, Score: {context.score}，賣出債券")
-      context.hedge_state = False
-
-
-  if context.score >= 38 and context.state == True:
-    order_target_percent(context.stock, 0.5)
-    print(f"Date: {backtest_date}, Score: {context.score}, 賣出 0050")
-    context.sell_date.append(pd.to_datetime(backtest_date))
-    context.state = False
-
-    if context.hedge_state == False :
-      order_target_percent(context.bond, 0.5)
-      print(f"Date: {backtest_date}, Score: {context.score}，買入債券避險")
-      context.hedge_state = True
+handle_data_5 = RotationEngine(hedge = '00865B', exit_stock_weight = 0.5, hedge_weight = 0.5).handle_data
 
-
-
-  if context.score > 16 and context.score < 38 and context.a == 0:
-    context.a = 1
-    print('進入景氣循環')
-    if context.state == False:
-      order_target_percent(context.stock, 1.0)
-      print(f"Date: {backtest_date}, Score: {context.score}, 買進 0050")
-      context.buy_date.append(pd.to_datetime(backtest_date))
-      context.state = True
-
-  # 因為 00685B 從 2019-11-25 才開始被交易
-  if pd.to_datetime(backtest_date) >= pd.to_datetime('2019-11-25') and context.b == 0:
-    context.b = 1
-    context.hedge_state = False
-
-def handle_data_6(context, data, score_data = df):
+def handle_data_6(context, data, score_lookup = score_by_date):
   if context.i == 0:
     order_target_percent(context.stock, 1.0)
 
   context.i += 1
   backtest_date = data.current_dt.date()
-  today_data = score_data[score_data['mdate'].shift(1) == pd.to_datetime(backtest_date)]
-  context.score = today_data['val_shifted'].iloc[-1]
+  context.score = score_lookup[backtest_date]
   record(score=context.score)
 
 
@@ -390,29 +306,30 @@ def analyze(context, perf):
 
 
 
-results = run_algorithm(
-            start = pd.Timestamp('2020-01-01', tz = 'utc'),
-            end = pd.Timestamp('2025-04-08', tz = 'utc'),
-            initialize = initialize,
-            handle_data = handle_data,
-            analyze = analyze,
-            bundle = 'tquant',
-            capital_base = 1e5)
-
-import pyfolio
-from pyfolio.utils import extract_rets_pos_txn_from_zipline
-plt.rcParams['font.sans-serif'] = ['Arial', 'Noto Sans CJK TC', 'SimHei']  
-plt.rcParams['axes.unicode_minus'] = False  
-returns, positions, transactions = extract_rets_pos_txn_from_zipline(results)
-benchmark_rets = results.benchmark_return
-pyfolio.tears.create_full_tear_sheet(returns=returns,
-                                     positions=positions,
-                                     transactions=transactions,
-                                     benchmark_rets=benchmark_rets
-                                    )
-
-
-positions.loc['2024-12-06 00:00:00+00:00':].head(10)
+if ZIPLINE_AVAILABLE:
+  results = run_algorithm(
+              start = pd.Timestamp('2020-01-01', tz = 'utc'),
+              end = pd.Timestamp('2025-04-08', tz = 'utc'),
+              initialize = initialize,
+              handle_data = handle_data,
+              analyze = analyze,
+              bundle = 'tquant',
+              capital_base = 1e5)
+
+  import pyfolio
+  from pyfolio.utils import extract_rets_pos_txn_from_zipline
+  plt.rcParams['font.sans-serif'] = ['Arial', 'Noto Sans CJK TC', 'SimHei']  
+  plt.rcParams['axes.unicode_minus'] = False  
+  returns, positions, transactions = extract_rets_pos_txn_from_zipline(results)
+  benchmark_rets = results.benchmark_return
+  pyfolio.tears.create_full_tear_sheet(returns=returns,
+                                       positions=positions,
+                                       transactions=transactions,
+                                       benchmark_rets=benchmark_rets
+                                      )
+
+
+  positions.loc['2024-12-06 00:00:00+00:00':].head(10)
 
 
 def initialize_2(context, pool = pool):
@@ -436,38 +353,96 @@ def initialize_2(context, pool = pool):
   context.stock = symbol('0050')
 
 
-metrods = [handle_data, handle_data_2, handle_data_3, handle_data_4, handle_data_5]
-label = ['Short-Term_Debt_ETF', 'Cash', 'Long-Term_Debt_ETF', 'Inverse_ETF_of_0050', '50:50(short-term bond)']
-algo = pd.DataFrame()
+def _run_variant(label):
+  """子程序：以 fork 繼承的設定執行單一變體，回傳 perf"""
+  handler, run_kwargs = _VARIANTS[label]
+  return run_algorithm(handle_data = handler, **run_kwargs)
 
-for idx, metrod in enumerate(metrods):
+def run_variants(handlers, labels, max_workers = None, **run_kwargs):
+  """以 process pool 並行執行多個 handle_data 變體回測
 
-  def analyze_2(context, perf):
-    algo[f'{label[idx]}'] = perf['algorithm_period_return']
-    if idx == 0:
-      algo['benchmark'] = perf['benchmark_period_return']
+  本程式為腳本 (沒有 __main__ 保護)，子程序以 fork 啟動並直接繼承 handler 與設定，
+  不需序列化函式。只在 Linux 使用 fork：macOS 上 matplotlib、zipline 與 requests 已載入後
+  fork 並不安全 (objc / Accelerate 可能崩潰)，其他平台改為依序執行。
 
+  Args:
+    handlers: handle_data 函式串列
+    labels: 對應的變體名稱
+    max_workers: 程序數上限，預設為 CPU 核心數
+    **run_kwargs: 其餘 run_algorithm 參數 (start, end, initialize, bundle, capital_base...)
 
-  results = run_algorithm(
-            start = pd.Timestamp('2020-01-01', tz = 'utc'),
-            end = pd.Timestamp('2025-04-08', tz = 'utc'),
-            initialize = initialize_2,
-            handle_data = metrod,
-            analyze = analyze_2,
-            bundle = 'tquant',
-            capital_base = 1e5)
-  
+  Returns:
+    dict: {變體名稱: perf DataFrame}
+  """
+  global _VARIANTS
+  _VARIANTS = {name: (handler, run_kwargs) for name, handler in zip(labels, handlers)}
+
+  if not sys.platform.startswith('linux') or 'fork' not in multiprocessing.get_all_start_methods():
+    print('⚠️  非 Linux 平台不使用 fork，變體回測改為依序執行')
+    return {name: _run_variant(name) for name in labels}
+
+  with ProcessPoolExecutor(max_workers = max_workers, mp_context = multiprocessing.get_context('fork')) as executor:
+    return dict(zip(labels, executor.map(_run_variant, labels)))
+
+
+metrods = [handle_data, handle_data_2, handle_data_3, handle_data_4, handle_data_5]
+label = ['Short-Term_Debt_ETF', 'Cash', 'Long-Term_Debt_ETF', 'Inverse_ETF_of_0050', '50:50(short-term bond)']
+
+if ZIPLINE_AVAILABLE:
+  perfs = run_variants(metrods, label,
+                       start = pd.Timestamp('2020-01-01', tz = 'utc'),
+                       end = pd.Timestamp('2025-04-08', tz = 'utc'),
+                       initialize = initialize_2,
+                       bundle = 'tquant',
+                       capital_base = 1e5)
+
+  algo = pd.DataFrame({name: perf['algorithm_period_return'] for name, perf in perfs.items()})
+  algo['benchmark'] = perfs[label[0]]['benchmark_period_return']
+
+
+  plt.figure(figsize = (18, 8))
+  plt.plot(algo.index, algo[f'{label[0]}'], label = label[0])
+  plt.plot(algo.index, algo[f'{label[1]}'], label = label[1])
+  plt.plot(algo.index, algo[f'{label[2]}'], label = label[2])
+  plt.plot(algo.index, algo[f'{label[3]}'], label = label[3])
+  #plt.plot(algo.index, algo[f'{label[4]}'], label = label[4])
+  plt.plot(algo.index, algo['benchmark'], label = 'benchmark')
+  plt.title('Different Hedge Asset')
+  plt.legend()
+  plt.show()
 
 
-plt.figure(figsize = (18, 8))
-plt.plot(algo.index, algo[f'{label[0]}'], label = label[0])
-plt.plot(algo.index, algo[f'{label[1]}'], label = label[1])
-plt.plot(algo.index, algo[f'{label[2]}'], label = label[2])
-plt.plot(algo.index, algo[f'{label[3]}'], label = label[3])
-#plt.plot(algo.index, algo[f'{label[4]}'], label = label[4])
-plt.plot(algo.index, algo['benchmark'], label = 'benchmark')
-plt.title('Different Hedge Asset')
-plt.legend()
-plt.show()
 
 
+# === 5. 門檻快速篩選 ===
+# 以每日陣列近似回測大量 (low, high, 出場權重) 組合，只把前幾名送進 zipline，並報告近似誤差
+screen_start, screen_end = pd.Timestamp('2020-01-01'), pd.Timestamp('2025-04-08')
+screen_prices = df.loc[screen_start:screen_end, ['close_d', 'close_d_bond']].set_axis(['0050', '00865B'], axis = 1)
+screen_score = pd.Series([score_by_date.get(d.date(), np.nan) for d in screen_prices.index], index = screen_prices.index)
+
+configs = [{'low': low, 'high': high, 'exit_stock_weight': weight, 'hedge_weight': 1.0 - weight, 'hedge_start': '2019-11-25'}
+           for low in range(8, 25) for high in range(28, 46) for weight in (0.0, 0.5)]
+screened = screen_rotations(screen_score, screen_prices, '0050', '00865B', configs)
+print(f"🔍 篩選 {len(configs)} 組輪動設定，前 5 名：")
+print(screened.head(5)[['low', 'high', 'exit_stock_weight', 'total_return', 'sharpe_ratio', 'max_drawdown', 'n_trades']])
+
+top = screened.head(3)
+candidates = [RotationEngine(hedge = '00865B', low = row.low, high = row.high,
+                             exit_stock_weight = row.exit_stock_weight, hedge_weight = row.hedge_weight)
+              for row in top.itertuples()]
+candidate_labels = [f'low={row.low} high={row.high} exit={row.exit_stock_weight}' for row in top.itertuples()]
+if ZIPLINE_AVAILABLE:
+  candidate_perfs = run_variants([engine.handle_data for engine in candidates], candidate_labels,
+                                 start = pd.Timestamp('2020-01-01', tz = 'utc'),
+                                 end = pd.Timestamp('2025-04-08', tz = 'utc'),
+                                 initialize = initialize_2,
+                                 bundle = 'tquant',
+                                 capital_base = 1e5)
+
+  # 近似回測與 zipline 的差距
+  for engine, name in zip(candidates, candidate_labels):
+    signals = rotation_signals(screen_score, engine.low, engine.high, engine.stock_weight,
+                               engine.exit_stock_weight, engine.hedge_weight, engine.hedge_start)
+    approx = simulate_rotation(screen_prices, signals[['stock_target', 'hedge_target']].set_axis(['0050', '00865B'], axis = 1))
+    print(f"📏 {name} 近似誤差：")
+    print(deviation_report(approx, candidate_perfs[name]).to_string())
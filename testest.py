@@ -54,6 +54,25 @@ df_ohlcv.tail(3)
 df_close = get_root_symbol_ohlcv(df_ohlcv,get_field='close', get_root_symbol='TX')
 df_close.tail(3)
 
+# %%
+# 需要反覆依商品 / 欄位取資料時，先建立 root_symbol 索引 (strategy/futures_index.py)：
+# 合約表只分割一次，之後每次查詢直接取用，結果與 get_root_symbol_ohlcv 相同
+import sys
+sys.path.insert(0, os.path.join(os.getcwd(), 'strategy'))
+from futures_index import FuturesContractIndex
+
+contract_index = FuturesContractIndex.from_prices(df_ohlcv)
+df_close = contract_index.get('close', 'TX')
+df_close.tail(3)
+
+# %%
+# 比較不同換月方式與價格調整 (add / mul / None) 的連續月：由合約資料一次算出所有版本 (strategy/continuous_futures.py)
+from continuous_futures import build_continuous_variants
+
+df_variants = build_continuous_variants(contract_index, 'TX', fields=['close'], offsets=[0, 1],
+                                        roll_styles=['calendar', 'volume'], adjustments=['add', 'mul', None])
+df_variants.xs('close', level='field', axis=1).tail(3)
+
 # %% [markdown]
 # ### <span style="color:#ff1493; font-weight:bold;">**get_continues_futures_price** </span>***`(root_symbol: str, offset: int, roll_style: str, adjustment: str, start_dt: str, end_dt: str, bundle: str)`***
 #   
@@ -610,14 +629,21 @@ roll_style = 'calendar'
 adjustment = 'add' 
 field = 'close'
 
-# 取得台指期貨連續價格資料
-cont_fut = get_continues_futures_price(root_symbol, offset, roll_style, adjustment,field, start_dt, end_dt, bundle='tquant_future')
-# 取得期貨三大法人資料
-df_fut_inst = institution_future_data.get_futures_institutions_data(root_symbol=[root_symbol],st=start_dt)
-# 取得期貨大額交易人資料
-df_fut_repttrader = rept_trader_future_data.get_futures_oi_trader_data(root_symbol=[root_symbol],st=start_dt,contract_code='A')
-
-df = pd.concat([cont_fut,df_fut_inst.set_index('mdate')[['oi_con_ls_net_finis','oi_con_ls_net_dealers','oi_con_ls_net_funds']],],axis=1).dropna()
+# 連續月價格、三大法人、大額交易人並行取得並對齊成 date × symbol × field 面板 (strategy/data_panel.py)
+# root_symbols 可放入多個商品，一次建好多商品因子研究所需的資料
+import sys
+sys.path.insert(0, os.path.join(os.getcwd(), 'strategy'))
+from data_providers import get_data_provider
+from data_panel import build_futures_panel
+
+inst_fields = ['oi_con_ls_net_finis','oi_con_ls_net_dealers','oi_con_ls_net_funds']
+trader_fields = ['top_10_trader_long_oi','top_10_trader_short_oi','top_10_institution_long_oi','top_10_institution_short_oi']
+panel = build_futures_panel(get_data_provider('tquant'), [root_symbol],
+                            {'price': [field], 'institutions': inst_fields, 'oi_trader': trader_fields},
+                            start_dt, end_dt,
+                            price_options={'offset': offset, 'roll_style': roll_style, 'adjustment': adjustment})
+
+df = panel.symbol(root_symbol)[[field] + inst_fields].dropna()
 df = df.reset_index().rename(columns={'index':'date'})
 
 # %% [markdown]